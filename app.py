@@ -1,75 +1,46 @@
 import streamlit as st
-import pandas as pd
 import os
-import json
 import uuid
 from datetime import datetime
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from storage import DATA_DIR
+from response_store import open_response_store
+from form_store import open_form_store
+from form_plans import compile_plan, form_plan, render_field, render_search, is_searchable
+from validation import validate_submission
+from tokens import open_recipient_tokens, TOKEN_PARAM
 
 # ----------------------------
 # CONFIG
 # ----------------------------
 st.set_page_config(page_title="Excel Form SaaS", layout="wide")
-st.title("📄 Excel → Form + Email System")
 
-DATA_DIR = "data_store"
 os.makedirs(DATA_DIR, exist_ok=True)
 
 META_PATH = os.path.join(DATA_DIR, "meta.json")
+FORMS_DB_PATH = os.path.join(DATA_DIR, "forms.db")
 RESP_PATH = os.path.join(DATA_DIR, "responses.xlsx")
+RESP_DB_PATH = os.path.join(DATA_DIR, "responses.db")
+CAMPAIGNS_DB_PATH = os.path.join(DATA_DIR, "campaigns.db")
 
 # ----------------------------
 # META
 # ----------------------------
-def load_meta():
-    if os.path.exists(META_PATH):
-        with open(META_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {"forms": {}}
+form_store = open_form_store(FORMS_DB_PATH, legacy_json=META_PATH)
 
-def save_meta(meta):
-    with open(META_PATH, "w", encoding="utf-8") as f:
-        json.dump(meta, f, indent=2)
+def load_meta():
+    # Served from memory; only re-read when another process has changed a form
+    return {"forms": form_store.forms()}
 
 meta = load_meta()
 
 # ----------------------------
 # RESPONSES
 # ----------------------------
-def load_responses():
-    if os.path.exists(RESP_PATH):
-        return pd.read_excel(RESP_PATH)
-    return pd.DataFrame()
+response_store = open_response_store(RESP_DB_PATH, legacy_xlsx=RESP_PATH, time_key="Time")
+recipient_tokens = open_recipient_tokens(CAMPAIGNS_DB_PATH)
 
-def save_responses(df):
-    df.to_excel(RESP_PATH, index=False)
-
-# ----------------------------
-# FIXED EMAIL FUNCTION (IMPORTANT)
-# ----------------------------
-def send_email_smtp(sender, password, to_email, subject, message):
-    try:
-        msg = MIMEMultipart()
-        msg["From"] = sender
-        msg["To"] = to_email
-        msg["Subject"] = subject
-        msg.attach(MIMEText(message, "plain"))
-
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.ehlo()
-        server.starttls()
-        server.ehlo()
-
-        server.login(sender, password)
-        server.send_message(msg)
-        server.quit()
-
-        return True
-    except Exception as e:
-        st.error(f"Email failed for {to_email}: {e}")
-        return False
+def load_responses():
+    return response_store.load()
 
 # ----------------------------
 # QUERY PARAMS
@@ -90,54 +61,69 @@ if mode == "form":
     form = meta["forms"][form_id]
     st.header(form["form_name"])
 
+    token = params.get(TOKEN_PARAM)
+    member = recipient_tokens.lookup(form_id, token) if token else None
+
     session_id = st.session_state.get("sid", str(uuid.uuid4())[:8])
     st.session_state["sid"] = session_id
 
-    values = {}
-
-    for col in form["columns"]:
-        values[col] = st.text_input(col, key=f"{col}_{session_id}")
+    for field in form_plan(form_id, form):
+        if is_searchable(field):
+            render_search(field, session_id)
+    values = {field["name"]: render_field(field, session_id) for field in form_plan(form_id, form)}
 
     if st.button("Submit"):
-        df = load_responses()
-
-        row = {
-            "FormID": form_id,
-            "FormName": form["form_name"],
-            "Session": session_id,
-            "Time": str(datetime.now())
-        }
-        row.update(values)
+        errors = validate_submission(form_plan(form_id, form), values)
+        for name, message in errors.items():
+            st.error(f"{name} {message}")
+
+        if not errors:
+            row = {
+                "FormID": form_id,
+                "FormName": form["form_name"],
+                "Session": session_id,
+                "Time": str(datetime.now())
+            }
+            if member:
+                row["RespondentEmail"] = member["email"]
+                row["RespondentToken"] = token
+            row.update(values)
 
-        df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-        save_responses(df)
+            response_store.append(row)
 
-        st.success("Submitted!")
-        st.rerun()
+            st.success("Submitted!")
+            st.rerun()
 
 # ----------------------------
 # ADMIN VIEW
 # ----------------------------
 else:
+    # Admin-only dependencies (openpyxl, SMTP) load here, so the respondent
+    # page starts and reruns without them
+    from campaigns import open_campaign_queue, LINK_PLACEHOLDER
+    from ingest import read_frame, read_members
+    campaign_queue = open_campaign_queue(CAMPAIGNS_DB_PATH)
+
+    st.title("📄 Excel → Form + Email System")
 
     st.header("Admin Panel")
 
     col1, col2 = st.columns(2)
 
     with col1:
-        member_file = st.file_uploader("Member File (Email column required)", type=["xlsx"])
+        member_file = st.file_uploader("Member File (Email column required)", type=["xlsx", "csv"])
     with col2:
         form_file = st.file_uploader("Form Excel File", type=["xlsx"])
 
     if member_file and form_file:
 
-        df_members = pd.read_excel(member_file)
+        members = read_members(member_file)
 
-        if "Email" not in df_members.columns:
+        if "Email" not in members.columns:
             st.error("Email column missing")
             st.stop()
 
-        df_form = pd.read_excel(form_file)
+        df_form = read_frame(form_file)
         df_form.columns = [str(c).strip() for c in df_form.columns]
 
         st.subheader("Form Preview")
@@ -157,28 +143,46 @@ else:
 
             meta["forms"][form_id_new] = {
                 "form_name": form_name,
-                "columns": list(df_form.columns)
+                "columns": list(df_form.columns),
+                "plan": compile_plan(list(df_form.columns), source_df=df_form)
             }
-            save_meta(meta)
+            form_store.save_form(form_id_new, meta["forms"][form_id_new])
 
             link = f"{base_url}?mode=form&form_id={form_id_new}"
 
-            emails = df_members["Email"].dropna().astype(str).tolist()
+            emails = members.emails
 
-            success = 0
+            # Sent by a background worker; survives reruns and page reloads
+            campaign_id = campaign_queue.create(
+                form_id_new,
+                sender,
+                emails,
+                "Form Invitation",
+                f"Please fill this form:\n{LINK_PLACEHOLDER}",
+                link=link
+            )
+            campaign_queue.start(campaign_id, password)
 
-            for email in emails:
-                ok = send_email_smtp(
-                    sender,
-                    password,
-                    email,
-                    "Form Invitation",
-                    f"Please fill this form:\n{link}"
-                )
-                if ok:
-                    success += 1
+            st.success(f"Sending {len(emails)} emails in the background")
 
-            st.success(f"Emails Sent: {success}/{len(emails)}")
+    # ----------------------------
+    # EMAIL STATUS
+    # ----------------------------
+    campaigns = campaign_queue.list_campaigns(limit=1)
+
+    if campaigns:
+        st.markdown("---")
+        st.subheader("Email Status")
+
+        progress = campaign_queue.progress(campaigns[0]["id"])
+        st.write(f"Emails Sent: {progress['sent']}/{progress['total']} (failed: {progress['failed']}, pending: {progress['pending']})")
+
+        if progress["pending"] and campaign_queue.is_active(campaigns[0]["id"]):
+            st.button("Refresh")
+        elif progress["pending"]:
+            resume_password = st.text_input("App Password (to resume sending)", type="password")
+            if st.button("Resume") and resume_password:
+                campaign_queue.start(campaigns[0]["id"], resume_password)
 
     # ----------------------------
     # RESPONSES
@@ -193,11 +197,7 @@ else:
 
         idx = st.selectbox("Select Row", df.index)
 
+        # Deletes only this row (by ResponseID); the old values go to the audit log
         if st.button("Delete"):
-            df = df.drop(idx)
-            save_responses(df)
+            response_store.delete(idx, actor="admin")
             st.rerun()
-
-        if st.button("Save"):
-            save_responses(df)
-            st.success("Updated")
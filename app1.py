@@ -1,20 +1,21 @@
 import streamlit as st
 import pandas as pd
 import os
-import json
 import uuid
 from datetime import datetime
-from openpyxl import load_workbook
+from functools import partial
 from io import BytesIO
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from storage import DATA_DIR
+from response_store import open_response_store
+from form_store import open_form_store
+from form_plans import compile_plan, form_plan, render_field, render_search, is_searchable, schema_changes
+from validation import validate_submission, validate_responses
+from tokens import open_recipient_tokens, TOKEN_PARAM
 
 # ----------------------------
 # Setup
 # ----------------------------
 st.set_page_config(page_title="📄 Excel → Web Form + Auto Email", layout="wide")
-st.title("📄 Excel → Web Form + Auto Email Sender + Dashboard")
 
 # ----------------------------
 # CSS (Dark & Light auto support)
@@ -36,66 +37,23 @@ h1,h2,h3,p,label,span,div { color: inherit !important; }
 # ----------------------------
 # Paths & Helpers
 # ----------------------------
-DATA_DIR = "data_store"
 os.makedirs(DATA_DIR, exist_ok=True)
 META_PATH = os.path.join(DATA_DIR, "meta.json")
+FORMS_DB_PATH = os.path.join(DATA_DIR, "forms.db")
 ALL_RESPONSES_PATH = os.path.join(DATA_DIR, "all_responses.xlsx")
+RESPONSES_DB_PATH = os.path.join(DATA_DIR, "all_responses.db")
+CAMPAIGNS_DB_PATH = os.path.join(DATA_DIR, "campaigns.db")
+EXPORTS_DIR = os.path.join(DATA_DIR, "exports")
+SNAPSHOTS_DIR = os.path.join(DATA_DIR, "snapshots")
 
-def load_meta():
-    if os.path.exists(META_PATH):
-        with open(META_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
-def save_meta(meta):
-    with open(META_PATH, "w", encoding="utf-8") as f:
-        json.dump(meta, f, ensure_ascii=False, indent=2)
-
-def detect_dropdowns(excel_file, df_columns):
-    excel_file.seek(0)
-    wb = load_workbook(excel_file, data_only=True)
-    ws = wb.active
-    dropdowns = {}
-    if ws.data_validations:
-        for dv in ws.data_validations.dataValidation:
-            try:
-                if dv.type=="list" and dv.formula1:
-                    formula=str(dv.formula1).strip('"')
-                    options=[x.strip() for x in formula.split(",")] if "," in formula else []
-                    for cell_range in dv.cells:
-                        cidx=cell_range.min_col-1
-                        if 0<=cidx<len(df_columns):
-                            dropdowns[df_columns[cidx]]=options
-            except: continue
-    return dropdowns
-
-def send_email_to_members(sender_email,password,members,subject,message):
-    sent_count=0
-    results=[]
-    for email in members:
-        try:
-            msg=MIMEMultipart()
-            msg["From"]=sender_email
-            msg["To"]=email
-            msg["Subject"]=subject
-            msg.attach(MIMEText(message,"plain"))
-            with smtplib.SMTP("smtp.gmail.com",587) as server:
-                server.starttls()
-                server.login(sender_email,password)
-                server.send_message(msg)
-            sent_count+=1
-            results.append({"Email":email,"Status":"✅ Sent"})
-        except Exception as e:
-            results.append({"Email":email,"Status":f"❌ Failed ({e})"})
-    return sent_count, results
+form_store = open_form_store(FORMS_DB_PATH, legacy_json=META_PATH)
 
-def load_responses():
-    if os.path.exists(ALL_RESPONSES_PATH):
-        return pd.read_excel(ALL_RESPONSES_PATH)
-    return pd.DataFrame()
+def load_meta():
+    # Served from memory; only re-read when another process has changed a form
+    return {"forms": form_store.forms()}
 
-def save_responses(df):
-    df.to_excel(ALL_RESPONSES_PATH,index=False)
+response_store = open_response_store(RESPONSES_DB_PATH, legacy_xlsx=ALL_RESPONSES_PATH)
+recipient_tokens = open_recipient_tokens(CAMPAIGNS_DB_PATH)
 
 # ----------------------------
 # URL Params
@@ -117,82 +75,82 @@ if mode=="form":
                 st.markdown(f"- [{f['form_name']}]({link})")
     else:
         info = meta["forms"][form_id]
+        # Personal invitation links identify the member; the plain link stays anonymous
+        token = params.get(TOKEN_PARAM, [None])[0]
+        member = recipient_tokens.lookup(form_id, token) if token else None
+        if token and member is None:
+            st.warning("⚠️ This personal link is not valid — your response will be recorded without your name.")
         st.header(f"🧾 {info['form_name']}")
         if "session_id" not in st.session_state:
             st.session_state["session_id"]=str(uuid.uuid4())[:8]
         session_id = st.session_state["session_id"]
-        dropdowns = info.get("dropdowns",{})
-        columns = info["columns"]
+        # Compiled once when the form was created; nothing to work out per rerun
+        plan = form_plan(form_id, info)
+
+        # Large option lists are searched on the server; the search boxes sit
+        # outside the form so typing updates the matches
+        for field in plan:
+            if is_searchable(field):
+                render_search(field, session_id)
 
         with st.form("user_form", clear_on_submit=False):
-            values={}
-            for col in columns:
-                if col in dropdowns:
-                    values[col]=st.selectbox(col,dropdowns[col], key=f"{col}_{session_id}")
-                else:
-                    values[col]=st.text_input(col,key=f"{col}_{session_id}")
+            values = {field["name"]: render_field(field, session_id) for field in plan}
             submitted=st.form_submit_button("✅ Submit Response")
 
         if submitted:
-            row={
-                "FormID":form_id,
-                "FormName":info["form_name"],
-                "UserSession":session_id,
-                "SubmittedAt":datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            }
-            row.update(values)
-            try:
-                responses=load_responses()
-                for col in row.keys():
-                    if col not in responses.columns:
-                        responses[col]=None
-                responses=pd.concat([responses,pd.DataFrame([row])],ignore_index=True)
-                save_responses(responses)
-                st.success("🎉 Response saved successfully!")
-                st.balloons()
-            except Exception as e:
-                st.error(f"❌ Error saving data: {e}")
+            # Checked against the form's rules, not just what the widgets allow
+            errors = validate_submission(plan, values)
+            if errors:
+                for name, message in errors.items():
+                    st.error(f"❌ {name} {message}")
+            else:
+                row={
+                    "FormID":form_id,
+                    "FormName":info["form_name"],
+                    "UserSession":session_id,
+                    "SubmittedAt":datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                }
+                if member:
+                    row["RespondentEmail"] = member["email"]
+                    row["RespondentToken"] = token
+                row.update(values)
+                try:
+                    response_store.append(row)
+                    st.success("🎉 Response saved successfully!")
+                    st.balloons()
+                except Exception as e:
+                    st.error(f"❌ Error saving data: {e}")
 
 # ----------------------------
 # ADMIN VIEW
 # ----------------------------
 else:
+    # Admin-only dependencies (openpyxl, SMTP, XLSX writer) load here, so the
+    # respondent page starts and reruns without them
+    from mailer import DEFAULT_WORKERS, DEFAULT_RATE, DEFAULT_PER_PROVIDER
+    from campaigns import open_campaign_queue, LINK_PLACEHOLDER
+    from ingest import read_members, read_form_source, detect_dropdowns, detect_validations
+    from exports import EXPORT_FORMATS, get_export, export_reader
+    from snapshots import open_snapshot
+    from members import filter_deliverable, deliverability_available
+    campaign_queue = open_campaign_queue(CAMPAIGNS_DB_PATH)
+    response_snapshot = open_snapshot(response_store, SNAPSHOTS_DIR)
+
+    st.title("📄 Excel → Web Form + Auto Email Sender + Dashboard")
     st.header("🧑‍💼 Admin Panel")
     st.write("Upload two Excel files — Member List & Form Source.")
     col1,col2 = st.columns(2)
     with col1:
-        member_file=st.file_uploader("📋 Upload Member List (must have 'Email' column)", type=["xlsx"])
+        member_file=st.file_uploader("📋 Upload Member List (must have 'Email' column)", type=["xlsx", "csv"])
     with col2:
         form_file=st.file_uploader("📄 Upload Form Source File", type=["xlsx"])
 
     if member_file and form_file:
         try:
-            df_members=pd.read_excel(member_file)
-
-            excel_data=pd.read_excel(form_file, header=None)
-            header_row_index=None
-            for i,row in excel_data.iterrows():
-                if row.count()>=len(row)/2:
-                    header_row_index=i
-                    break
-            df_form=pd.read_excel(form_file, header=header_row_index if header_row_index is not None else 0)
-
-            # Clean header names
-            cleaned_cols=[]
-            seen=set()
-            prev_name=None
-            for c in df_form.columns:
-                name=str(c).strip() if pd.notna(c) and str(c).strip() else prev_name
-                if name:
-                    name=name.replace("_"," ").title()
-                    if name in seen:
-                        i=2
-                        while f"{name}_{i}" in seen: i+=1
-                        name=f"{name}_{i}"
-                    seen.add(name)
-                    cleaned_cols.append(name)
-                    prev_name=name
-            df_form.columns=cleaned_cols
+            members = read_members(member_file)
+
+            # Read Form Excel with dynamic header detection (cached per file contents)
+            df_form = read_form_source(form_file)
 
             # Editable preview + recovery
             st.subheader("👀 Edit Form Data (Live Preview)")
@@ -261,10 +219,20 @@ else:
                     st.error(f"❌ Failed to save: {e}")
 
             # Continue workflow
-            if "Email" not in df_members.columns:
+            if "Email" not in members.columns:
                 st.error("❌ Member file must contain an 'Email' column.")
             else:
+                # Addresses were normalised, validated and de-duplicated on upload
+                st.info(f"👥 {len(members.emails)} unique valid addresses — {members.duplicates} duplicates and {len(members.rejected)} invalid addresses skipped.")
+                if not members.rejected.empty:
+                    st.download_button(
+                        label=f"📥 Download Skipped Addresses ({len(members.rejected)})",
+                        data=members.rejected.to_csv(index=False).encode("utf-8"),
+                        file_name="skipped_addresses.csv",
+                        mime="text/csv"
+                    )
                 dropdowns=detect_dropdowns(form_file, list(st.session_state.current_form_df.columns))
+                validations=detect_validations(form_file, list(st.session_state.current_form_df.columns))
                 st.success(f"✅ Form fields detected: {len(st.session_state.current_form_df.columns)}")
                 st.write(st.session_state.current_form_df.columns.tolist())
                 if dropdowns:
@@ -275,6 +243,17 @@ else:
                 base_url=st.text_input("Your Streamlit App Public URL (example: https://yourapp.streamlit.app)")
                 sender_email=st.text_input("Your Gmail Address:")
                 password=st.text_input("Your Gmail App Password:", type="password")
+                with st.expander("⚙️ Sending Options"):
+                    send_workers = st.number_input("Parallel SMTP connections", min_value=1, max_value=10, value=DEFAULT_WORKERS)
+                    send_rate = st.number_input("Max emails per second", min_value=0.5, max_value=50.0, value=DEFAULT_RATE)
+                    send_per_provider = st.number_input("Max concurrent sends per recipient domain", min_value=1, max_value=10, value=DEFAULT_PER_PROVIDER)
+                    if deliverability_available():
+                        check_domains = st.checkbox("Skip addresses whose domain has no mail server")
+                    else:
+                        check_domains = False
+                        st.caption("Install 'dnspython' (pip install dnspython) to skip addresses whose domain has no mail server.")
+                    remind_days = st.number_input("Remind non-respondents every N days (0 = off)", min_value=0.0, max_value=60.0, value=0.0)
+                    remind_max = st.number_input("Max reminders", min_value=1, max_value=10, value=2)
 
                 if st.button("🚀 Create Form & Send Emails"):
                     if not base_url:
@@ -282,59 +261,281 @@ else:
                     elif not sender_email or not password:
                         st.error("Please enter Gmail and App Password.")
                     else:
+                        # Checked before the form is saved, so a failure here leaves nothing half-created
+                        emails = members.emails
+                        if check_domains:
+                            emails, undeliverable = filter_deliverable(emails)
+                            if not undeliverable.empty:
+                                st.warning(f"⚠️ {len(undeliverable)} addresses skipped: their domain has no mail server.")
                         form_id_new=str(uuid.uuid4())[:10]
-                        forms=meta.get("forms",{})
-                        forms[form_id_new]={
+                        meta["forms"][form_id_new] = {
                             "form_name":form_name,
                             "columns":list(st.session_state.current_form_df.columns),
                             "dropdowns":dropdowns,
                             "created_at":datetime.now().isoformat(),
+                            "plan":compile_plan(
+                                list(st.session_state.current_form_df.columns),
+                                dropdowns,
+                                st.session_state.current_form_df,
+                                validations,
+                            ),
                         }
-                        meta["forms"]=forms
-                        save_meta(meta)
+                        form_store.save_form(form_id_new, meta["forms"][form_id_new])
                         link=f"{base_url.rstrip('/')}/?mode=form&form_id={form_id_new}"
                         st.success(f"✅ Form created successfully!\n{link}")
-                        st.info("📧 Sending form link to all members...")
-                        emails=df_members["Email"].dropna().unique().tolist()
                         subject=f"Form Invitation: {form_name}"
-                        message=f"Hello,\n\nPlease fill out the form below:\n{link}\n\nThank you!"
-                        sent_count,send_results=send_email_to_members(sender_email,password,emails,subject,message)
-                        st.success(f"🎉 Emails sent: {sent_count}/{len(emails)}")
-                        st.subheader("📧 Email Send Status")
-                        st.table(pd.DataFrame(send_results))
+                        message=f"Hello,\n\nPlease fill out the form below:\n{LINK_PLACEHOLDER}\n\nThank you!"
+                        campaign_id = campaign_queue.create(
+                            form_id_new, sender_email, emails, subject, message,
+                            options={"workers": int(send_workers), "rate": float(send_rate), "per_provider": int(send_per_provider)},
+                            link=link,
+                        )
+                        campaign_queue.start(campaign_id, password)
+                        if remind_days:
+                            campaign_queue.schedule_reminders(
+                                campaign_id, RESPONSES_DB_PATH, password, float(remind_days) * 24, int(remind_max))
+                        st.session_state["campaign_id"] = campaign_id
+                        st.info(f"📧 Sending form link to {len(emails)} members in the background — progress is shown under 📧 Email Send Status.")
 
         except Exception as e:
             st.error(f"❌ Error processing files: {e}")
 
+    # ----------------------------
+    # Email Send Status
+    # ----------------------------
+    st.markdown("---")
+    st.subheader("📧 Email Send Status")
+    campaigns = campaign_queue.list_campaigns()
+    if not campaigns:
+        st.info("No invitations sent yet.")
+    else:
+        campaign_labels = {c["id"]: f"{c['subject']} — {c['created_at']}" for c in campaigns}
+        campaign_ids = list(campaign_labels)
+        selected_campaign = st.session_state.get("campaign_id")
+        campaign_id = st.selectbox(
+            "Select Campaign:",
+            campaign_ids,
+            index=campaign_ids.index(selected_campaign) if selected_campaign in campaign_ids else 0,
+            format_func=campaign_labels.get
+        )
+        progress = campaign_queue.progress(campaign_id)
+        finished = progress["sent"] + progress["failed"]
+        st.progress(finished / progress["total"] if progress["total"] else 1.0)
+        st.write(f"🎉 Emails sent: {progress['sent']}/{progress['total']} — failed: {progress['failed']}, pending: {progress['pending']}")
+
+        if progress["pending"] and campaign_queue.is_active(campaign_id):
+            st.button("🔄 Refresh Status")
+        elif progress["pending"]:
+            st.warning("⏸️ This campaign was interrupted. Enter the Gmail App Password again to resume it.")
+            error = next(c["error"] for c in campaigns if c["id"] == campaign_id)
+            if error:
+                st.caption(f"Stopped by: {error}")
+            resume_password = st.text_input("Gmail App Password:", type="password", key=f"resume_{campaign_id}")
+            if st.button("▶️ Resume Sending") and resume_password:
+                campaign_queue.start(campaign_id, resume_password)
+                st.success("Resumed — click 🔄 Refresh Status to follow progress.")
+        st.dataframe(campaign_queue.recipients(campaign_id), use_container_width=True)
+
+        if progress["failed"]:
+            dead_letters = campaign_queue.dead_letters(campaign_id)
+            if not dead_letters.empty:
+                st.download_button(
+                    label=f"📥 Download Permanently Failed Addresses ({len(dead_letters)})",
+                    data=dead_letters.to_csv(index=False).encode("utf-8"),
+                    file_name=f"failed_addresses_{campaign_id}.csv",
+                    mime="text/csv"
+                )
+            if not campaign_queue.is_active(campaign_id) and st.button("🔁 Retry Temporarily Failed"):
+                requeued = campaign_queue.requeue_transient(campaign_id)
+                st.info(f"{requeued} addresses queued again — enter the App Password above and click ▶️ Resume Sending.")
+
+        if campaign_queue.tokens.for_campaign(campaign_id) or campaign_queue.reminder_schedule(campaign_id):
+            waiting = campaign_queue.non_respondent_count(campaign_id, RESPONSES_DB_PATH)
+            st.write(f"⏳ Members who have not responded yet: {waiting}")
+            schedule = campaign_queue.reminder_schedule(campaign_id)
+            if schedule:
+                next_at = datetime.fromtimestamp(schedule["next_at"]).strftime("%Y-%m-%d %H:%M")
+                st.caption(
+                    f"Reminders sent: {schedule['sent']}/{schedule['max_reminders']}"
+                    + (f" — next one due {next_at}" if schedule["status"] == "active" else " — schedule finished")
+                    + (f" — last error: {schedule['last_error']}" if schedule["last_error"] else "")
+                )
+                if schedule["waiting_for_password"]:
+                    st.warning("⏸️ Scheduled reminders are paused until the Gmail App Password is entered again below.")
+            with st.expander("📨 Remind Non-Respondents"):
+                remind_password = st.text_input("Gmail App Password:", type="password", key=f"remind_{campaign_id}")
+                if schedule and schedule["waiting_for_password"] and st.button("▶️ Resume Scheduled Reminders") and remind_password:
+                    campaign_queue.remember_password(campaign_id, remind_password)
+                    st.success("Scheduled reminders resumed.")
+                if st.button("📨 Remind Non-Respondents Now") and remind_password:
+                    reminder_id = campaign_queue.send_reminder(campaign_id, RESPONSES_DB_PATH, remind_password)
+                    if reminder_id is None:
+                        st.info("Everyone has responded — no reminder sent.")
+                    else:
+                        st.session_state["campaign_id"] = reminder_id
+                        st.success("Reminder queued — select it above to follow its progress.")
+
     # ----------------------------
     # Responses Dashboard
     # ----------------------------
     st.markdown("---")
     st.subheader("📊 Responses Dashboard")
-    responses=load_responses()
-    if responses.empty:
+    if not response_store.count():
         st.info("No responses submitted yet.")
     else:
         form_filter=st.selectbox("Select Form to View Responses:", ["All"]+[f["form_name"] for f in meta.get("forms",{}).values()])
-        if form_filter!="All":
-            form_id_list=[fid for fid,f in meta["forms"].items() if f["form_name"]==form_filter]
-            responses_display=responses[responses["FormID"]==form_id_list[0]] if form_id_list else pd.DataFrame()
-        else:
-            responses_display=responses.copy()
+        filter_form_id = None
+        if form_filter != "All":
+            form_id_list = [fid for fid, f in meta["forms"].items() if f["form_name"] == form_filter]
+            filter_form_id = form_id_list[0] if form_id_list else ""
+        form_count = response_store.count(form_id=filter_form_id)
+
+        # Only the selected form's rows for the current page are read
+        page_col, size_col = st.columns(2)
+        with size_col:
+            page_size = st.selectbox("Rows per page", [50, 100, 500, 1000], index=1)
+        page_count = max(1, -(-form_count // page_size))
+        with page_col:
+            page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1)
+        page_ends = st.session_state.setdefault("response_page_ends", {}).setdefault((filter_form_id, page_size), {})
+        responses_display = response_store.load_page(filter_form_id, page, page_size, page_ends)
+
+        # Responses that arrived since this session last looked at the form
+        seen_key = filter_form_id or "All"
+        last_seen_id = st.session_state.setdefault("responses_seen_id", {}).get(seen_key)
+        latest_id = response_store.max_id(form_id=filter_form_id)
+        if last_seen_id is not None and latest_id > last_seen_id:
+            new_responses = response_store.load(form_id=filter_form_id, since_id=last_seen_id)
+            st.info(f"🆕 {len(new_responses)} new responses since last refresh")
+            st.dataframe(new_responses)
+        st.session_state.responses_seen_id[seen_key] = latest_id
+        st.button("🔄 Refresh Responses")
+
+        # Re-check every stored response of the form against its current rules
+        if filter_form_id and st.button("🔎 Re-validate Responses"):
+            with st.spinner("Checking responses..."):
+                report = validate_responses(response_store, form_plan(filter_form_id, meta["forms"][filter_form_id]), filter_form_id)
+            if report.invalid.empty:
+                st.success(f"✅ All {report.checked} responses pass the form's rules.")
+            else:
+                st.warning(f"⚠️ {len(report.invalid)} of {report.checked} responses break the form's rules.")
+                st.table(report.counts[report.counts > 0].rename("Invalid Responses").to_frame())
+                st.dataframe(report.invalid.head(1000))
+                st.download_button(
+                    label="📥 Download Invalid Response IDs",
+                    data=report.invalid.to_csv().encode("utf-8"),
+                    file_name=f"invalid_responses_{filter_form_id}.csv",
+                    mime="text/csv"
+                )
+
+        # Columns of a form that was already sent out; each change is saved as a
+        # new schema version and stored responses are renamed per layout, not per row
+        if filter_form_id:
+            with st.expander("✏️ Column Management (sent form)"):
+                form_info = meta["forms"][filter_form_id]
+                form_columns = list(form_info["columns"])
+                st.caption(f"Schema version {form_info.get('schema_version', 1)}")
+                schema_action = st.radio(
+                    "Select Action", ["None","Rename Column","Delete Column","Add Column","Restore Deleted Column"],
+                    horizontal=True, key="schema_action")
+                new_columns, renamed = None, {}
+                if schema_action == "Rename Column":
+                    col_to_rename = st.selectbox("Select column to rename", form_columns, key="schema_rename_col")
+                    new_name = st.text_input("Enter new column name:", key="schema_new_name")
+                    if st.button("✅ Rename Now", key="schema_rename"):
+                        if not new_name or new_name in form_columns:
+                            st.warning("Enter a column name that is not used yet.")
+                        else:
+                            renamed = {col_to_rename: new_name}
+                            new_columns = [new_name if c == col_to_rename else c for c in form_columns]
+                elif schema_action == "Delete Column":
+                    col_to_delete = st.selectbox("Select column to delete", form_columns, key="schema_delete_col")
+                    st.caption("Answers already given are kept and come back if the column is restored.")
+                    if st.button("🗑️ Delete Column", key="schema_delete"):
+                        new_columns = [c for c in form_columns if c != col_to_delete]
+                elif schema_action == "Add Column":
+                    new_col_name = st.text_input("Enter new column name:", key="schema_add_name")
+                    if st.button("➕ Add Column", key="schema_add"):
+                        if not new_col_name or new_col_name in form_columns:
+                            st.warning("Column already exists.")
+                        else:
+                            new_columns = form_columns + [new_col_name]
+                elif schema_action == "Restore Deleted Column":
+                    deleted_cols = [f["name"] for f in form_info.get("retired_fields", [])]
+                    if deleted_cols:
+                        col_to_restore = st.selectbox("Select deleted column to restore", deleted_cols, key="schema_restore_col")
+                        if st.button("♻️ Restore Column", key="schema_restore"):
+                            new_columns = form_columns + [col_to_restore]
+                    else:
+                        st.info("No deleted columns found to restore.")
+                if new_columns is not None:
+                    try:
+                        for old, new in renamed.items():
+                            response_store.rename_field(filter_form_id, old, new)
+                        version = form_store.save_schema(
+                            filter_form_id, new_columns, renamed,
+                            **schema_changes(filter_form_id, form_info, new_columns, renamed))
+                        st.success(f"✅ Saved as schema version {version}.")
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+
+        # Counters kept up to date on every submit; nothing is re-aggregated here
+        if filter_form_id:
+            with st.expander("📊 Form Statistics"):
+                stats_plan = form_plan(filter_form_id, meta["forms"][filter_form_id])
+                response_store.track_options(filter_form_id, [f["name"] for f in stats_plan if f["type"] == "select"])
+                stats = response_store.stats(filter_form_id)
+                invited = campaign_queue.tokens.invited(filter_form_id)
+                total_col, invited_col, rate_col = st.columns(3)
+                total_col.metric("Responses", stats.responses)
+                invited_col.metric("Invited Members", invited)
+                rate_col.metric("Response Rate", f"{stats.respondents / invited:.0%}" if invited else "—")
+                if not stats.daily.empty:
+                    st.write("Submissions per day")
+                    st.bar_chart(stats.daily)
+                if stats.responses:
+                    completion = stats.answered.reindex([f["name"] for f in stats_plan], fill_value=0) / stats.responses
+                    st.write("Field completion")
+                    st.dataframe(completion.map("{:.0%}".format).rename("Completed").to_frame(), use_container_width=True)
+                if not stats.options.empty:
+                    option_field = st.selectbox("Option field:", sorted(stats.options["Field"].unique()), key="stats_option_field")
+                    by_day = stats.options[stats.options["Field"] == option_field].fillna({"Day": "(no date)"}).pivot_table(
+                        index="Day", columns="Option", values="Responses", aggfunc="sum", fill_value=0)
+                    st.table(by_day.sum().sort_values(ascending=False).rename("Responses").to_frame())
+                    st.dataframe(by_day, use_container_width=True)
+
+        # Summaries read a single column of the form's columnar snapshot
+        if filter_form_id:
+            with st.expander("📈 Field Summary"):
+                summary_field = st.selectbox("Field:", meta["forms"][filter_form_id]["columns"], key="summary_field")
+                values = response_snapshot.read(form_id=filter_form_id, columns=[summary_field])[summary_field]
+                answered = values.dropna()
+                answered = answered[answered.astype(str).str.strip() != ""]
+                numbers = pd.to_numeric(answered, errors="coerce")
+                st.write(f"Answered: {len(answered)} of {len(values)} responses")
+                if len(answered) and numbers.notna().all():
+                    st.table(numbers.describe().rename(summary_field).to_frame())
+                elif len(answered):
+                    st.table(answered.value_counts().head(20).rename("Responses").to_frame())
 
         if not responses_display.empty:
             # Hide metadata
-            hidden_cols=["FormID","FormName","UserSession","SubmittedAt"]
+            hidden_cols=["FormID","FormName","UserSession","SubmittedAt","RespondentToken"]
             display_df=responses_display.drop(columns=[c for c in hidden_cols if c in responses_display.columns])
             st.dataframe(display_df,use_container_width=True)
 
             # Download
-            to_download=BytesIO()
-            display_df.to_excel(to_download,index=False)
-            to_download.seek(0)
-            st.download_button(
-                label="📥 Download Responses",
-                data=to_download,
-                file_name="responses.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            # Built only when requested, streamed from the store, reused until responses change
+            export_format = st.radio("Export format", list(EXPORT_FORMATS), horizontal=True, key="export_format")
+            export_args = dict(form_id=filter_form_id, exclude=hidden_cols)
+            export_path = get_export(response_store, export_format, EXPORTS_DIR, **export_args)
+            if export_path is None and st.button("📦 Prepare Download"):
+                with st.spinner("Building export..."):
+                    export_path = get_export(response_store, export_format, EXPORTS_DIR, build=True, **export_args)
+            if export_path is not None:
+                st.download_button(
+                    label="📥 Download Responses",
+                    data=export_reader(export_path, partial(get_export, response_store, export_format, EXPORTS_DIR, build=True, **export_args)),
+                    file_name=f"responses{EXPORT_FORMATS[export_format][0]}",
+                    mime=EXPORT_FORMATS[export_format][1]
+                )
@@ -0,0 +1,388 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from datetime import datetime
+import pandas as pd
+from mailer import stream_send
+from storage import connect
+from tokens import open_recipient_tokens, personal_link
+
+# ----------------------------
+# Invitation Campaigns
+# ----------------------------
+# A campaign (sender, message, options) and every recipient's status and
+# attempt count are persisted before anything is sent. Sending happens on a
+# background thread outside the Streamlit script run and records each result
+# as it completes, so a rerun or browser reconnect does not stop it and a
+# restarted process can pick up the recipients that are still pending.
+#
+# The SMTP password is only ever kept in memory; resuming a campaign after a
+# restart needs it to be entered again.
+#
+# Transient SMTP errors are retried inside the mailer; what still fails is
+# recorded with its error kind. Permanently failed addresses form the
+# campaign's dead-letter list, and transient failures can be re-queued.
+# Failures of the sender itself (rejected login, refused sender, quota) say
+# nothing about the recipients: they stay pending and the campaign is
+# interrupted with the error, to be resumed once it is fixed.
+#
+# A campaign created with a form link issues every recipient a personal
+# token (see tokens.py); LINK_PLACEHOLDER in the message is replaced by that
+# recipient's link when the message is sent.
+#
+# Reminders: a campaign can be given a cadence. Each time a reminder is due,
+# the members who still have no response are found with an anti-join of the
+# campaign's tokens against the response store's (form_id, respondent) index,
+# and a child campaign re-using their original personal links is sent to
+# them. Like sending, reminders need the password in memory, so after a
+# restart they wait until it is entered again.
+#
+# When several processes share the database, a campaign is only sent by the
+# process holding its lease (owner + heartbeat). A process that dies stops
+# renewing the lease, and the campaign can be resumed elsewhere once it
+# expires.
+
+LEASE_SECONDS = 60
+LINK_PLACEHOLDER = "{link}"
+REMINDER_TICK_SECONDS = 60
+REMINDER_SUBJECT_PREFIX = "Reminder: "
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class CampaignQueue:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._workers = {}
+        self._lock = threading.Lock()
+        self._passwords = {}
+        self._scheduler = None
+        self._init_schema()
+        self.tokens = open_recipient_tokens(db_path)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS campaigns ("
+                "id TEXT PRIMARY KEY, form_id TEXT, sender TEXT, subject TEXT, message TEXT, "
+                "options TEXT, status TEXT, error TEXT, created_at TEXT, updated_at TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS campaign_recipients ("
+                "campaign_id TEXT, email TEXT, status TEXT DEFAULT 'pending', attempts INTEGER DEFAULT 0, "
+                "last_error TEXT, updated_at TEXT, PRIMARY KEY (campaign_id, email))"
+            )
+            columns = [r["name"] for r in conn.execute("PRAGMA table_info(campaign_recipients)")]
+            if "error_kind" not in columns:
+                conn.execute("ALTER TABLE campaign_recipients ADD COLUMN error_kind TEXT")
+            columns = [r["name"] for r in conn.execute("PRAGMA table_info(campaigns)")]
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE campaigns ADD COLUMN owner TEXT")
+                conn.execute("ALTER TABLE campaigns ADD COLUMN heartbeat REAL")
+            if "link" not in columns:
+                conn.execute("ALTER TABLE campaigns ADD COLUMN link TEXT")
+            if "parent_id" not in columns:
+                conn.execute("ALTER TABLE campaigns ADD COLUMN parent_id TEXT")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS reminder_schedules ("
+                "campaign_id TEXT PRIMARY KEY, responses_db TEXT, interval_hours REAL, max_reminders INTEGER, "
+                "sent INTEGER DEFAULT 0, next_at REAL, status TEXT, last_error TEXT)"
+            )
+
+    def create(self, form_id, sender, recipients, subject, message, options=None, link=None, parent_id=None):
+        # Reminder campaigns (parent_id set) re-use their parent's tokens
+        campaign_id = str(uuid.uuid4())[:12]
+        now = _now()
+        recipients = list(dict.fromkeys(recipients))
+        if link and not parent_id:
+            self.tokens.issue(form_id, campaign_id, recipients)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO campaigns (id, form_id, sender, subject, message, options, status, error, created_at, updated_at, "
+                "link, parent_id) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+                (campaign_id, form_id, sender, subject, message, json.dumps(options or {}), "queued", None, now, now,
+                 link, parent_id),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO campaign_recipients (campaign_id, email, updated_at) VALUES (?,?,?)",
+                [(campaign_id, email, now) for email in recipients],
+            )
+        return campaign_id
+
+    def is_active(self, campaign_id):
+        # Running here, or in another process whose lease is still fresh
+        worker = self._workers.get(campaign_id)
+        if worker is not None and worker.is_alive():
+            return True
+        row = self._conn().execute(
+            "SELECT 1 FROM campaigns WHERE id=? AND status='running' AND heartbeat>?",
+            (campaign_id, time.time() - LEASE_SECONDS),
+        ).fetchone()
+        return row is not None
+
+    def _claim(self, campaign_id):
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                "UPDATE campaigns SET status='running', owner=?, heartbeat=?, error=NULL, updated_at=? "
+                "WHERE id=? AND NOT (status='running' AND heartbeat>?)",
+                (WORKER_ID, time.time(), _now(), campaign_id, time.time() - LEASE_SECONDS),
+            )
+        return cur.rowcount == 1
+
+    def _keep_lease(self, campaign_id, stop):
+        conn = self._conn()
+        while not stop.wait(LEASE_SECONDS / 3):
+            with conn:
+                conn.execute("UPDATE campaigns SET heartbeat=? WHERE id=? AND owner=?", (time.time(), campaign_id, WORKER_ID))
+
+    def start(self, campaign_id, password):
+        with self._lock:
+            if self.is_active(campaign_id) or not self._claim(campaign_id):
+                return False
+            worker = threading.Thread(target=self._run, args=(campaign_id, password), name=f"campaign-{campaign_id}", daemon=True)
+            self._workers[campaign_id] = worker
+            worker.start()
+            return True
+
+    def _set_status(self, conn, campaign_id, status, error=None):
+        with conn:
+            conn.execute(
+                "UPDATE campaigns SET status=?, error=?, owner=NULL, heartbeat=NULL, updated_at=? WHERE id=?",
+                (status, error, _now(), campaign_id),
+            )
+
+    def _run(self, campaign_id, password):
+        conn = self._conn()
+        camp = conn.execute("SELECT * FROM campaigns WHERE id=?", (campaign_id,)).fetchone()
+        if camp is None:
+            return
+        pending = [r["email"] for r in conn.execute(
+            "SELECT email FROM campaign_recipients WHERE campaign_id=? AND status='pending' ORDER BY rowid", (campaign_id,))]
+        message = camp["message"]
+        if camp["link"]:
+            tokens = self.tokens.for_campaign(camp["parent_id"] or campaign_id)
+
+            def message(i, template=camp["message"], link=camp["link"]):
+                token = tokens.get(pending[i])
+                return template.replace(LINK_PLACEHOLDER, personal_link(link, token) if token else link)
+        stop = threading.Event()
+        threading.Thread(target=self._keep_lease, args=(campaign_id, stop), name=f"campaign-lease-{campaign_id}", daemon=True).start()
+        try:
+            options = json.loads(camp["options"] or "{}")
+            sender_error = None
+            for i, res in stream_send(camp["sender"], password, pending, camp["subject"], message, **options):
+                if res["ErrorKind"] == "sender":
+                    sender_error = sender_error or res["Status"]
+                    continue
+                sent = res["Status"].startswith("✅")
+                with conn:
+                    conn.execute(
+                        "UPDATE campaign_recipients SET status=?, attempts=attempts+?, last_error=?, error_kind=?, updated_at=? "
+                        "WHERE campaign_id=? AND email=?",
+                        ("sent" if sent else "failed", res["Attempts"], None if sent else res["Status"], res["ErrorKind"],
+                         _now(), campaign_id, pending[i]),
+                    )
+            if sender_error:
+                self._set_status(conn, campaign_id, "interrupted", sender_error)
+            else:
+                self._set_status(conn, campaign_id, "done")
+        except Exception as e:
+            self._set_status(conn, campaign_id, "interrupted", str(e))
+        finally:
+            stop.set()
+
+    def list_campaigns(self, limit=50):
+        rows = self._conn().execute("SELECT * FROM campaigns ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def progress(self, campaign_id):
+        counts = {"pending": 0, "sent": 0, "failed": 0}
+        for r in self._conn().execute(
+                "SELECT status, COUNT(*) AS n FROM campaign_recipients WHERE campaign_id=? GROUP BY status", (campaign_id,)):
+            counts[r["status"]] = r["n"]
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def recipients(self, campaign_id):
+        rows = self._conn().execute(
+            "SELECT email, status, attempts, last_error FROM campaign_recipients WHERE campaign_id=? ORDER BY rowid",
+            (campaign_id,),
+        ).fetchall()
+        labels = {"pending": "⏳ Pending", "sent": "✅ Sent"}
+        return pd.DataFrame(
+            [{"Email": r["email"], "Status": labels.get(r["status"]) or r["last_error"], "Attempts": r["attempts"]} for r in rows],
+            columns=["Email", "Status", "Attempts"],
+        )
+
+    def dead_letters(self, campaign_id):
+        rows = self._conn().execute(
+            "SELECT email, last_error, attempts, updated_at FROM campaign_recipients "
+            "WHERE campaign_id=? AND status='failed' AND error_kind='permanent' ORDER BY rowid",
+            (campaign_id,),
+        ).fetchall()
+        return pd.DataFrame(
+            [{"Email": r["email"], "Reason": r["last_error"], "Attempts": r["attempts"], "FailedAt": r["updated_at"]} for r in rows],
+            columns=["Email", "Reason", "Attempts", "FailedAt"],
+        )
+
+    def requeue_transient(self, campaign_id):
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                "UPDATE campaign_recipients SET status='pending', updated_at=? "
+                "WHERE campaign_id=? AND status='failed' AND error_kind='transient'",
+                (_now(), campaign_id),
+            )
+        return cur.rowcount
+
+    # ----------------------------
+    # Reminders
+    # ----------------------------
+    def _root(self, campaign_id):
+        row = self._conn().execute("SELECT * FROM campaigns WHERE id=?", (campaign_id,)).fetchone()
+        if row is not None and row["parent_id"]:
+            row = self._conn().execute("SELECT * FROM campaigns WHERE id=?", (row["parent_id"],)).fetchone()
+        return row
+
+    def _attach(self, conn, responses_db):
+        attached = getattr(self._local, "attached", None)
+        if attached != responses_db:
+            if attached is not None:
+                conn.execute("DETACH DATABASE responses_db")
+            conn.execute("ATTACH DATABASE ? AS responses_db", (responses_db,))
+            self._local.attached = responses_db
+
+    def _non_respondent_query(self, select, campaign_id, responses_db):
+        # Anti-join: each token is one probe of responses(form_id, respondent);
+        # addresses that bounced permanently are not reminded
+        root = self._root(campaign_id)
+        if root is None:
+            return None
+        conn = self._conn()
+        self._attach(conn, responses_db)
+        return conn.execute(
+            f"SELECT {select} FROM recipient_tokens t "
+            "WHERE t.campaign_id=? "
+            "AND NOT EXISTS (SELECT 1 FROM responses_db.responses r WHERE r.form_id=t.form_id AND r.respondent=t.token) "
+            "AND NOT EXISTS (SELECT 1 FROM campaign_recipients c WHERE c.campaign_id=t.campaign_id AND c.email=t.email "
+            "AND c.status='failed' AND c.error_kind='permanent')",
+            (root["id"],),
+        )
+
+    def non_respondents(self, campaign_id, responses_db):
+        cur = self._non_respondent_query("t.email", campaign_id, responses_db)
+        return [] if cur is None else [r[0] for r in cur]
+
+    def non_respondent_count(self, campaign_id, responses_db):
+        cur = self._non_respondent_query("COUNT(*)", campaign_id, responses_db)
+        return 0 if cur is None else cur.fetchone()[0]
+
+    def send_reminder(self, campaign_id, responses_db, password):
+        # Returns the reminder campaign's id, or None if everyone has answered
+        root = self._root(campaign_id)
+        emails = self.non_respondents(campaign_id, responses_db)
+        if root is None or not emails:
+            return None
+        reminder_id = self.create(
+            root["form_id"], root["sender"], emails, REMINDER_SUBJECT_PREFIX + root["subject"], root["message"],
+            options=json.loads(root["options"] or "{}"), link=root["link"], parent_id=root["id"],
+        )
+        self.start(reminder_id, password)
+        return reminder_id
+
+    def schedule_reminders(self, campaign_id, responses_db, password, interval_hours, max_reminders):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO reminder_schedules (campaign_id, responses_db, interval_hours, max_reminders, sent, next_at, status) "
+                "VALUES (?,?,?,?,0,?,'active') ON CONFLICT(campaign_id) DO UPDATE SET "
+                "responses_db=excluded.responses_db, interval_hours=excluded.interval_hours, "
+                "max_reminders=excluded.max_reminders, next_at=excluded.next_at, status='active'",
+                (campaign_id, responses_db, interval_hours, max_reminders, time.time() + interval_hours * 3600),
+            )
+        self.remember_password(campaign_id, password)
+
+    def reminder_schedule(self, campaign_id):
+        root = self._root(campaign_id)
+        row = root and self._conn().execute("SELECT * FROM reminder_schedules WHERE campaign_id=?", (root["id"],)).fetchone()
+        if not row:
+            return None
+        schedule = dict(row)
+        schedule["waiting_for_password"] = schedule["status"] == "active" and root["id"] not in self._passwords
+        return schedule
+
+    def remember_password(self, campaign_id, password):
+        # Kept in memory only, for the scheduler thread of this process
+        root = self._root(campaign_id)
+        if root is None or not password:
+            return
+        with self._lock:
+            self._passwords[root["id"]] = password
+            if self._scheduler is None or not self._scheduler.is_alive():
+                self._scheduler = threading.Thread(target=self._scheduler_loop, name="campaign-reminders", daemon=True)
+                self._scheduler.start()
+
+    def _scheduler_loop(self):
+        while True:
+            time.sleep(REMINDER_TICK_SECONDS)
+            try:
+                self.run_due_reminders()
+            except Exception:
+                continue
+
+    def run_due_reminders(self, now=None):
+        now = time.time() if now is None else now
+        conn = self._conn()
+        due = conn.execute("SELECT * FROM reminder_schedules WHERE status='active' AND next_at<=?", (now,)).fetchall()
+        for schedule in due:
+            campaign_id = schedule["campaign_id"]
+            password = self._passwords.get(campaign_id)
+            children = [r["id"] for r in conn.execute("SELECT id FROM campaigns WHERE parent_id=?", (campaign_id,))]
+            if password is None or any(self.is_active(c) for c in [campaign_id] + children):
+                continue
+            # Claimed by moving next_at, so only one process sends each reminder
+            sent = schedule["sent"] + 1
+            with conn:
+                cur = conn.execute(
+                    "UPDATE reminder_schedules SET sent=?, next_at=?, status=? WHERE campaign_id=? AND next_at=?",
+                    (sent, now + schedule["interval_hours"] * 3600, "done" if sent >= schedule["max_reminders"] else "active",
+                     campaign_id, schedule["next_at"]),
+                )
+            if cur.rowcount != 1:
+                continue
+            try:
+                if self.send_reminder(campaign_id, schedule["responses_db"], password) is None:
+                    with conn:
+                        conn.execute("UPDATE reminder_schedules SET status='done' WHERE campaign_id=?", (campaign_id,))
+            except Exception as e:
+                with conn:
+                    conn.execute("UPDATE reminder_schedules SET last_error=? WHERE campaign_id=?", (str(e), campaign_id))
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+def open_campaign_queue(path):
+    key = os.path.abspath(path)
+    with _queues_lock:
+        if key not in _queues:
+            _queues[key] = CampaignQueue(path)
+        return _queues[key]
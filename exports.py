@@ -0,0 +1,122 @@
+import os
+import csv
+import hashlib
+import threading
+import xlsxwriter
+
+# ----------------------------
+# Response Exports
+# ----------------------------
+# Exports are built only when someone asks for one, by streaming rows out of
+# the response store in chunks: XLSX through xlsxwriter's constant-memory
+# mode, CSV row by row, Parquet one row group per chunk. The finished file is
+# kept on disk and reused until the store's version changes.
+
+EXPORT_FORMATS = {
+    "XLSX": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV": (".csv", "text/csv"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+_exports = {}
+_exports_lock = threading.Lock()
+_build_locks = {}
+
+def _export_columns(store, form_id, exclude):
+    columns = {}
+    for chunk in store.iter_rows(form_id=form_id):
+        for row in chunk:
+            for col in row:
+                if col not in exclude:
+                    columns.setdefault(col, None)
+    return list(columns)
+
+def _write_xlsx(path, columns, chunks):
+    wb = xlsxwriter.Workbook(path, {"constant_memory": True, "strings_to_urls": False})
+    ws = wb.add_worksheet()
+    ws.write_row(0, 0, columns)
+    r = 1
+    for chunk in chunks:
+        for row in chunk:
+            ws.write_row(r, 0, [row.get(c) for c in columns])
+            r += 1
+    wb.close()
+
+def _write_csv(path, columns, chunks):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for chunk in chunks:
+            writer.writerows([row.get(c) for c in columns] for row in chunk)
+
+def _write_parquet(path, columns, chunks):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs the 'pyarrow' package (pip install pyarrow)")
+    # Responses are free text, so every column is written as a string column
+    schema = pa.schema([(str(c), pa.string()) for c in columns])
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            arrays = [pa.array([None if row.get(c) is None else str(row.get(c)) for row in chunk], pa.string()) for c in columns]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+_WRITERS = {"XLSX": _write_xlsx, "CSV": _write_csv, "Parquet": _write_parquet}
+
+def _cached_export(key, version, path):
+    # Caller holds _exports_lock
+    cached = _exports.get(key)
+    if cached and cached[0] == version and os.path.exists(cached[1]):
+        return cached[1]
+    # Another process sharing the export directory may have built it already
+    if os.path.exists(path):
+        _exports[key] = (version, path)
+        return path
+    return None
+
+def get_export(store, fmt, export_dir, form_id=None, exclude=(), build=False):
+    # Returns the path of an up-to-date export, building it only if build=True.
+    # Only the cache lookup is shared; a build holds a lock for its own export,
+    # so other dashboards don't wait on it.
+    key = (store.db_path, form_id, tuple(exclude), fmt)
+    version = store.version()
+    ext = EXPORT_FORMATS[fmt][0]
+    tag = hashlib.sha1("\n".join(sorted(map(str, exclude))).encode("utf-8")).hexdigest()[:8]
+    path = os.path.join(export_dir, f"responses_{form_id or 'all'}_{tag}_v{version}{ext}")
+    with _exports_lock:
+        found = _cached_export(key, version, path)
+        if found is not None or not build:
+            return found
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+    with build_lock:
+        with _exports_lock:
+            found = _cached_export(key, version, path)
+        if found is not None:
+            return found
+        os.makedirs(export_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        columns = _export_columns(store, form_id, set(exclude))
+        _WRITERS[fmt](tmp_path, columns, store.iter_rows(form_id=form_id))
+        os.replace(tmp_path, path)
+        with _exports_lock:
+            previous = _exports.get(key)
+            _exports[key] = (version, path)
+        if previous and previous[1] != path and os.path.exists(previous[1]):
+            os.remove(previous[1])
+        return path
+
+def export_reader(path, rebuild=None):
+    # For st.download_button(data=...): the file is only read when clicked.
+    # A newer build may have replaced it since the button was drawn; then
+    # rebuild() (a get_export(..., build=True) call) supplies the current one.
+    def read():
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            if rebuild is None:
+                raise
+        with open(rebuild(), "rb") as f:
+            return f.read()
+    return read
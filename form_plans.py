@@ -0,0 +1,220 @@
+import re
+import threading
+from datetime import date, timedelta
+from bisect import bisect_left
+import streamlit as st
+import pandas as pd
+
+# ----------------------------
+# Form Render Plans
+# ----------------------------
+# A form definition is compiled once, when the form is created, into a list
+# of fields (name, widget type, widget key template, options, rules) that is
+# stored with the definition. The respondent page just walks that list.
+# Field types are inferred from the source sheet's column dtypes, so numeric
+# and date columns get proper inputs instead of free-text boxes. The sheet's
+# data validations are carried in each field's rules (see validation.py) and
+# take precedence over the inferred type.
+
+EMAIL_RE = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+# Streamlit's date picker only offers ten years either side of today unless
+# given bounds; birth or hire dates need far more than that
+DATE_MIN = date(1900, 1, 1)
+DATE_MAX = date(2100, 12, 31)
+TYPE_SAMPLE_ROWS = 1000
+LARGE_OPTION_THRESHOLD = 200
+OPTION_MATCH_LIMIT = 50
+
+def infer_field_type(name, series=None):
+    if series is not None:
+        if pd.api.types.is_bool_dtype(series):
+            return "text"
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return "date"
+        if pd.api.types.is_numeric_dtype(series):
+            return "number"
+        sample = series.dropna().head(TYPE_SAMPLE_ROWS).astype(str)
+        if len(sample) and sample.str.match(EMAIL_RE).all():
+            return "email"
+    if re.search(r"e-?mail", str(name), re.IGNORECASE):
+        return "email"
+    return "text"
+
+VALIDATION_FIELD_TYPES = {"whole": "number", "decimal": "number", "date": "date"}
+
+def compile_plan(columns, dropdowns=None, source_df=None, validations=None):
+    dropdowns = dropdowns or {}
+    validations = validations or {}
+    plan = []
+    for col in columns:
+        options = dropdowns.get(col) or []
+        validation = validations.get(col)
+        series = source_df[col] if source_df is not None and col in source_df.columns else None
+        if isinstance(series, pd.DataFrame):
+            series = series.iloc[:, 0]
+        if options:
+            field_type = "select"
+        elif validation and validation["type"] in VALIDATION_FIELD_TYPES:
+            field_type = VALIDATION_FIELD_TYPES[validation["type"]]
+        else:
+            field_type = infer_field_type(col, series)
+        rules = {}
+        if field_type == "select":
+            rules["options"] = list(options)
+        elif field_type == "number":
+            rules["integer"] = bool(
+                (validation and validation["type"] == "whole")
+                or (series is not None and pd.api.types.is_integer_dtype(series))
+            )
+        elif field_type == "email":
+            rules["format"] = "email"
+        if validation:
+            rules["validation"] = validation
+            rules["required"] = not validation.get("allow_blank", True)
+        plan.append({
+            "name": col,
+            "type": field_type,
+            "key": str(col).replace("{", "{{").replace("}", "}}") + "_{session_id}",
+            "options": list(options),
+            "rules": rules,
+        })
+    return plan
+
+_legacy_plans = {}
+_legacy_lock = threading.Lock()
+
+def form_plan(form_id, info):
+    # Forms created before plans existed are compiled once per process
+    if "plan" in info:
+        return info["plan"]
+    signature = (tuple(info["columns"]), repr(info.get("dropdowns")))
+    with _legacy_lock:
+        cached = _legacy_plans.get(form_id)
+        if cached is None or cached[0] != signature:
+            cached = (signature, compile_plan(info["columns"], info.get("dropdowns")))
+            _legacy_plans[form_id] = cached
+        return cached[1]
+
+def schema_changes(form_id, info, columns, renamed=None):
+    # Plan, dropdowns and retired fields for a new schema version of a form.
+    # Fields keep their type and rules across renames; deleted fields are
+    # retired rather than dropped, so restoring a column brings them back.
+    renamed = renamed or {}
+    plan = form_plan(form_id, info)
+    known = {f["name"]: f for f in info.get("retired_fields", [])}
+    known.update({renamed.get(f["name"], f["name"]): f for f in plan})
+    new_plan = []
+    for col in columns:
+        field = known.pop(col, None)
+        if field is None:
+            new_plan.extend(compile_plan([col]))
+        else:
+            new_plan.append(dict(field, name=col, key=compile_plan([col])[0]["key"]))
+    dropdowns = {renamed.get(k, k): v for k, v in (info.get("dropdowns") or {}).items()}
+    return {"plan": new_plan, "dropdowns": dropdowns, "retired_fields": list(known.values())}
+
+# ----------------------------
+# Large option lists
+# ----------------------------
+# A dropdown with thousands of options (product codes, employee IDs) would
+# send the whole list to the browser on every rerun. Above the threshold the
+# options stay on the server: the respondent types into a search box and only
+# the best matches are offered. Each list is indexed once per process, sorted
+# for prefix lookups and by trigram for substring lookups.
+
+class OptionIndex:
+    def __init__(self, options):
+        self.options = list(options)
+        self._folded = [str(o).casefold() for o in self.options]
+        self._sorted = sorted((f, i) for i, f in enumerate(self._folded))
+        self._keys = [f for f, _ in self._sorted]
+        self._trigrams = {}
+        for i, f in enumerate(self._folded):
+            for gram in {f[j:j + 3] for j in range(len(f) - 2)}:
+                self._trigrams.setdefault(gram, []).append(i)
+
+    def _substring_hits(self, query):
+        if len(query) < 3:
+            return [i for i, f in enumerate(self._folded) if query in f]
+        postings = sorted((self._trigrams.get(query[j:j + 3], []) for j in range(len(query) - 2)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+        return sorted(i for i in candidates if query in self._folded[i])
+
+    def search(self, query, limit=OPTION_MATCH_LIMIT):
+        # Prefix matches first (alphabetically), then other substring matches
+        query = str(query or "").strip().casefold()
+        if not query:
+            return self.options[:limit]
+        hits = []
+        pos = bisect_left(self._keys, query)
+        while pos < len(self._keys) and self._keys[pos].startswith(query) and len(hits) < limit:
+            hits.append(self._sorted[pos][1])
+            pos += 1
+        if len(hits) < limit:
+            seen = set(hits)
+            hits += [i for i in self._substring_hits(query) if i not in seen][:limit - len(hits)]
+        return [self.options[i] for i in hits]
+
+_option_indexes = {}
+_option_lock = threading.Lock()
+
+def option_index(options):
+    signature = tuple(options)
+    with _option_lock:
+        index = _option_indexes.get(signature)
+        if index is None:
+            index = _option_indexes[signature] = OptionIndex(signature)
+        return index
+
+def is_searchable(field):
+    return field["type"] == "select" and len(field["options"]) > LARGE_OPTION_THRESHOLD
+
+def _search_key(field, session_id):
+    return "search_" + field["key"].format(session_id=session_id)
+
+def render_search(field, session_id):
+    # Typing here has to rerun the script, so callers keep it outside st.form
+    return st.text_input(f"🔍 Search {field['name']} ({len(field['options'])} options)", key=_search_key(field, session_id))
+
+def _date_bounds(field):
+    # (min, max) for the date picker, narrowed by the field's date validation
+    rule = (field.get("rules") or {}).get("validation") or {}
+    if rule.get("type") != "date":
+        return DATE_MIN, DATE_MAX
+    values = [None if v is None else date.fromisoformat(str(v)[:10]) for v in (rule.get("values") or [])] + [None, None]
+    low, high = values[:2]
+    operator = rule.get("operator") or "between"
+    if operator == "between" and low and high:
+        return low, high
+    if operator in ("greaterThan", "greaterThanOrEqual") and low:
+        return low + timedelta(days=operator == "greaterThan"), DATE_MAX
+    if operator in ("lessThan", "lessThanOrEqual") and low:
+        return DATE_MIN, low - timedelta(days=operator == "lessThan")
+    if operator == "equal" and low:
+        return low, low
+    return DATE_MIN, DATE_MAX
+
+def render_field(field, session_id):
+    label = field["name"]
+    key = field["key"].format(session_id=session_id)
+    if is_searchable(field):
+        query = st.session_state.get(_search_key(field, session_id), "")
+        matches = option_index(field["options"]).search(query)
+        return st.selectbox(label, matches, key=key)
+    if field["type"] == "select":
+        return st.selectbox(label, field["options"], key=key)
+    if field["type"] == "number":
+        step = 1 if field["rules"].get("integer") else 0.01
+        value = st.number_input(label, value=None, step=step, key=key)
+        if value is not None and field["rules"].get("integer"):
+            value = int(value)
+        return value
+    if field["type"] == "date":
+        min_value, max_value = _date_bounds(field)
+        value = st.date_input(label, value=None, min_value=min_value, max_value=max_value, key=key)
+        return value.isoformat() if value is not None else None
+    if field["type"] == "email":
+        return st.text_input(label, value="", placeholder="name@example.com", key=key)
+    return st.text_input(label, value="", key=key)
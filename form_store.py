@@ -0,0 +1,114 @@
+import os
+import json
+import threading
+from datetime import datetime
+from storage import connect
+
+# ----------------------------
+# Form Metadata Store
+# ----------------------------
+# Each form definition is its own row, so creating a form writes one record
+# (in a transaction) instead of rewriting every form. Definitions are kept in
+# memory per process; on each read the store only asks SQLite whether any
+# other connection has committed since (PRAGMA data_version), and reloads
+# only if so.
+#
+# A form's columns can change after it was sent out. Each change is saved as
+# a new schema version (columns plus the renames that led to them) in the
+# form's schema_history, so older responses can always be matched to the
+# columns they were collected under.
+
+class FormStore:
+    def __init__(self, db_path, legacy_json=None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = connect(db_path, check_same_thread=False)
+        self._forms = None
+        self._data_version = None
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS forms (id TEXT PRIMARY KEY, data TEXT NOT NULL, created_at TEXT)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT)")
+        if legacy_json:
+            self._import_legacy(legacy_json)
+
+    def _import_legacy(self, json_path):
+        if not os.path.exists(json_path):
+            return
+        with self._conn:
+            # Checked under the write lock so concurrent processes import once
+            self._conn.execute("BEGIN IMMEDIATE")
+            if self._conn.execute("SELECT value FROM store_meta WHERE key='legacy_imported'").fetchone():
+                return
+            with open(json_path, "r", encoding="utf-8") as f:
+                forms = json.load(f).get("forms", {})
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO forms (id, data, created_at) VALUES (?,?,?)",
+                [(fid, json.dumps(info, ensure_ascii=False), info.get("created_at")) for fid, info in forms.items()],
+            )
+            self._conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('legacy_imported', ?)", (json_path,))
+
+    def _refresh(self):
+        # Caller holds the lock
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._forms is None or version != self._data_version:
+            rows = self._conn.execute("SELECT id, data FROM forms ORDER BY rowid").fetchall()
+            self._forms = {fid: json.loads(data) for fid, data in rows}
+            self._data_version = version
+
+    def forms(self):
+        with self._lock:
+            self._refresh()
+            return dict(self._forms)
+
+    def get(self, form_id):
+        with self._lock:
+            self._refresh()
+            return self._forms.get(form_id)
+
+    def _write(self, form_id, definition):
+        # Caller holds the lock
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO forms (id, data, created_at) VALUES (?,?,?) "
+                "ON CONFLICT(id) DO UPDATE SET data=excluded.data",
+                (form_id, json.dumps(definition, ensure_ascii=False), definition.get("created_at")),
+            )
+        # Our own commits don't move this connection's data_version
+        self._forms[form_id] = definition
+
+    def save_form(self, form_id, definition):
+        with self._lock:
+            self._refresh()
+            self._write(form_id, definition)
+
+    def save_schema(self, form_id, columns, renamed=None, **changes):
+        # Saves a new schema version of an existing form; returns its number
+        with self._lock:
+            self._refresh()
+            info = dict(self._forms[form_id])
+            history = list(info.get("schema_history") or [
+                {"version": 1, "columns": info["columns"], "renamed": {}, "saved_at": info.get("created_at")}
+            ])
+            version = history[-1]["version"] + 1
+            history.append({
+                "version": version,
+                "columns": list(columns),
+                "renamed": dict(renamed or {}),
+                "saved_at": datetime.now().isoformat(),
+            })
+            info.update(changes, columns=list(columns), schema_version=version, schema_history=history)
+            self._write(form_id, info)
+            return version
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def open_form_store(path, **kwargs):
+    key = os.path.abspath(path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = FormStore(path, **kwargs)
+        return _stores[key]
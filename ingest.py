@@ -0,0 +1,374 @@
+import re
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.utils.datetime import from_excel
+try:
+    from openpyxl.worksheet._reader import WorkSheetParser
+except ImportError:
+    WorkSheetParser = None
+from members import read_member_emails
+
+# ----------------------------
+# Workbook Ingestion
+# ----------------------------
+# Every widget interaction reruns the admin script, which used to re-parse
+# both uploads each time. Parsed results are cached per process, keyed by a
+# hash of the file contents, and evicted least-recently-used once the cache
+# exceeds its entry or memory budget.
+
+MAX_CACHE_ENTRIES = 32
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+HEADER_SCAN_ROWS = 50
+HEADER_THRESHOLD = 0.5
+
+
+class LRUCache:
+    def __init__(self, max_entries=MAX_CACHE_ENTRIES, max_bytes=MAX_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key, value, size):
+        with self._lock:
+            if key in self._items:
+                self._bytes -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self._bytes += size
+            while self._items and (len(self._items) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+_cache = LRUCache()
+
+def file_digest(excel_file):
+    if hasattr(excel_file, "getvalue"):
+        data = excel_file.getvalue()
+    else:
+        excel_file.seek(0)
+        data = excel_file.read()
+        excel_file.seek(0)
+    return hashlib.sha256(data).hexdigest()
+
+def _size_of(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, tuple):
+        return sum(_size_of(v) for v in value if v is not None)
+    if isinstance(value, dict):
+        return sum(len(str(k)) + _size_of(v) for k, v in value.items())
+    if isinstance(value, list):
+        return sum(len(str(v)) for v in value) + 8 * len(value)
+    return 64
+
+def _cached(kind, excel_file, build):
+    key = (kind, file_digest(excel_file))
+    value = _cache.get(key)
+    if value is None:
+        excel_file.seek(0)
+        value = build()
+        _cache.put(key, value, _size_of(value))
+    return value
+
+# ----------------------------
+# Parsers
+# ----------------------------
+# The form source is read in one streaming pass: openpyxl's read-only mode
+# parses the sheet XML once, yielding rows as it goes, and the sheet's
+# <dataValidations> block (which comes after the cell data) is picked up by
+# the same parser at the end. Header row, column names, data frame and
+# dropdowns all come out of that single pass.
+#
+# The header is the first row, within the first scan_rows rows, whose share
+# of non-empty cells reaches the threshold. Non-empty counts are collected
+# while streaming, so detection is a single NumPy comparison over the window.
+
+FormSource = namedtuple("FormSource", ["header_row", "frame", "dropdowns", "validations"])
+
+def detect_header_row(non_empty_counts, width, scan_rows=HEADER_SCAN_ROWS, threshold=HEADER_THRESHOLD):
+    counts = np.asarray(non_empty_counts[:scan_rows], dtype=np.int64)
+    hits = np.flatnonzero(counts >= width * threshold)
+    return int(hits[0]) if hits.size else None
+
+def header_names(values):
+    # Same names pandas gives: "Unnamed: i" for blanks, ".1" suffixes for repeats
+    names = []
+    seen = set()
+    for i, v in enumerate(values):
+        base = f"Unnamed: {i}" if v is None else v
+        name, k = base, 0
+        while name in seen:
+            k += 1
+            name = f"{base}.{k}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+def clean_columns(columns):
+    cleaned_cols = []
+    seen = set()
+    prev_name = None
+    for c in columns:
+        name = str(c).strip() if pd.notna(c) and str(c).strip() else prev_name
+        if name:
+            name = name.replace("_", " ").title()
+            if name in seen:
+                i = 2
+                while f"{name}_{i}" in seen: i += 1
+                name = f"{name}_{i}"
+            seen.add(name)
+            cleaned_cols.append(name)
+            prev_name = name
+    return cleaned_cols
+
+# Data validations become per-column rules: {"type", "operator", "values",
+# "options", "allow_blank"}. Bounds and list sources are resolved to plain
+# values here, so the rules can be stored with the form and checked without
+# the workbook. List sources may be inline ("a,b,c"), ranges on any sheet or
+# defined names; each referenced sheet is read at most once per workbook, and
+# the result is cached with the rest of the form source by content hash.
+
+VALIDATION_TYPES = ("whole", "decimal", "date", "textLength", "list")
+DATE_FORMULA_RE = re.compile(r"^DATE\((\d+),(\d+),(\d+)\)$", re.IGNORECASE)
+
+
+class _WorkbookCells:
+    def __init__(self, wb, form_sheet, form_rows):
+        self._wb = wb
+        self._form_title = form_sheet.title
+        self._sheets = {form_sheet.title: form_rows}
+        self._names = {name.lower(): dn for name, dn in wb.defined_names.items()}
+        # Names scoped to the form sheet shadow workbook-wide ones
+        self._names.update((name.lower(), dn) for name, dn in getattr(form_sheet, "defined_names", {}).items())
+
+    def _rows(self, title):
+        if title not in self._sheets:
+            if title not in self._wb.sheetnames:
+                return None
+            self._sheets[title] = list(self._wb[title].iter_rows(values_only=True))
+        return self._sheets[title]
+
+    def _range_values(self, title, coord):
+        rows = self._rows(title.strip("'").replace("''", "'"))
+        if rows is None:
+            return None
+        try:
+            min_col, min_row, max_col, max_row = range_boundaries(coord.replace("$", ""))
+        except (ValueError, TypeError):
+            return None
+        values = []
+        for row in rows[(min_row or 1) - 1:max_row or len(rows)]:
+            values.extend(v for v in row[(min_col or 1) - 1:max_col or len(row)] if v is not None)
+        return values
+
+    def values(self, ref):
+        # Non-empty values of a range, cell or defined name, in sheet order;
+        # None if the reference cannot be resolved (e.g. INDIRECT/OFFSET)
+        ref = ref.strip().lstrip("=")
+        dn = self._names.get(ref.lower())
+        if dn is not None:
+            destinations = list(dn.destinations)
+            if not destinations:
+                return None
+            values = []
+            for title, coord in destinations:
+                found = self._range_values(title, coord)
+                if found is None:
+                    return None
+                values.extend(found)
+            return values
+        if "!" in ref:
+            title, coord = ref.rsplit("!", 1)
+        else:
+            title, coord = self._form_title, ref
+        return self._range_values(title, coord)
+
+
+def _formula_value(formula, rule_type, cells, epoch):
+    if formula is None:
+        return None
+    formula = str(formula).strip().lstrip("=")
+    match = DATE_FORMULA_RE.match(formula.replace(" ", ""))
+    if match:
+        y, m, d = map(int, match.groups())
+        return pd.Timestamp(y, m, d).date().isoformat()
+    try:
+        value = float(formula)
+    except ValueError:
+        found = cells.values(formula)
+        if not found or len(found) != 1:
+            return None
+        value = found[0]
+    if rule_type == "date":
+        if isinstance(value, (int, float)):
+            value = from_excel(value, epoch)
+        return pd.Timestamp(value).date().isoformat() if hasattr(value, "year") else None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _list_options(formula, cells):
+    formula = str(formula or "").strip().lstrip("=")
+    if formula.startswith('"'):
+        return [x.strip() for x in formula.strip('"').split(",")]
+    found = cells.values(formula) if formula else None
+    if not found:
+        return []
+    return list(dict.fromkeys(str(v).strip() for v in found))
+
+def _rules_by_index(validations, cells, epoch):
+    # Per 0-based column index, every rule applied to it with its row span;
+    # one validation may cover several ranges and several columns
+    by_index = {}
+    if not validations:
+        return by_index
+    for dv in validations.dataValidation:
+        if dv.type not in VALIDATION_TYPES:
+            continue
+        rule = {"type": dv.type, "operator": dv.operator or "between", "allow_blank": bool(dv.allow_blank)}
+        if dv.type == "list":
+            rule["options"] = _list_options(dv.formula1, cells)
+            if not rule["options"]:
+                continue
+        else:
+            rule["values"] = [_formula_value(f, dv.type, cells, epoch) for f in (dv.formula1, dv.formula2)]
+        for cell_range in dv.cells:
+            for col in range(cell_range.min_col, cell_range.max_col + 1):
+                by_index.setdefault(col - 1, []).append((cell_range.min_row, cell_range.max_row, rule))
+    return by_index
+
+def _data_rules(by_index, first_data_row):
+    # The rule covering the most data rows wins; rules above the data are ignored
+    rules = {}
+    for col, spans in by_index.items():
+        covered = [(max_row - max(min_row, first_data_row), rule) for min_row, max_row, rule in spans if max_row >= first_data_row]
+        if covered:
+            rules[col] = max(covered, key=lambda c: c[0])[1]
+    return rules
+
+def _dropdowns_by_index(rules):
+    return {i: rule["options"] for i, rule in rules.items() if rule["type"] == "list"}
+
+def _parse_sheet(wb, ws):
+    # One pass over the sheet XML yields both the cells and the data
+    # validations. This uses openpyxl internals (pinned in requirements.txt);
+    # AttributeError means they changed and the caller falls back.
+    if WorkSheetParser is None:
+        raise AttributeError("openpyxl WorkSheetParser is not available")
+    rows = []
+    counts = []
+    with ws._get_source() as src:
+        parser = WorkSheetParser(src, ws._shared_strings, data_only=True, epoch=wb.epoch,
+                                 date_formats=wb._date_formats, timedelta_formats=wb._timedelta_formats)
+        for idx, cells in parser.parse():
+            while len(rows) < idx - 1:
+                rows.append(())
+                counts.append(0)
+            values = [None] * (cells[-1]["column"] if cells else 0)
+            non_empty = 0
+            for cell in cells:
+                if cell["value"] is not None:
+                    values[cell["column"] - 1] = cell["value"]
+                    non_empty += 1
+            while values and values[-1] is None:
+                values.pop()
+            rows.append(tuple(values))
+            counts.append(non_empty)
+        validations = getattr(parser, "data_validations", None)
+    return rows, counts, validations
+
+def _read_sheet(excel_file, ws):
+    # Public-API fallback: cells from the read-only sheet, validations from a
+    # second, full load (read-only worksheets don't expose them)
+    rows = []
+    counts = []
+    for row in ws.iter_rows(values_only=True):
+        values = list(row)
+        while values and values[-1] is None:
+            values.pop()
+        rows.append(tuple(values))
+        counts.append(sum(v is not None for v in values))
+    if hasattr(excel_file, "seek"):
+        excel_file.seek(0)
+    full = load_workbook(excel_file, data_only=True)
+    try:
+        validations = full.active.data_validations
+    finally:
+        full.close()
+    return rows, counts, validations
+
+def _stream_sheet(excel_file):
+    wb = load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        try:
+            rows, counts, validations = _parse_sheet(wb, ws)
+        except AttributeError:
+            rows, counts, validations = _read_sheet(excel_file, ws)
+        rules = _rules_by_index(validations, _WorkbookCells(wb, ws, rows), wb.epoch)
+    finally:
+        wb.close()
+    while rows and not rows[-1]:
+        rows.pop()
+        counts.pop()
+    return rows, counts, rules
+
+def ingest_form_source(excel_file, scan_rows=HEADER_SCAN_ROWS, threshold=HEADER_THRESHOLD):
+    rows, counts, rules = _stream_sheet(excel_file)
+    width = max((len(r) for r in rows), default=0)
+    header_row_index = detect_header_row(counts, width, scan_rows, threshold)
+    header_at = header_row_index if header_row_index is not None else 0
+    header = list(rows[header_at]) if rows else []
+    header += [None] * (width - len(header))
+    data = [r + (None,) * (width - len(r)) for r in rows[header_at + 1:] if any(v is not None for v in r)]
+    df_form = pd.DataFrame.from_records(data, columns=header_names(header)).infer_objects()
+    df_form.columns = clean_columns(df_form.columns)
+    rules = _data_rules(rules, header_at + 2)
+    return FormSource(header_row_index, df_form, _dropdowns_by_index(rules), rules)
+
+# ----------------------------
+# Cached entry points
+# ----------------------------
+def read_frame(excel_file):
+    return _cached("frame", excel_file, lambda: pd.read_excel(excel_file)).copy()
+
+def read_members(member_file):
+    # Normalised, validated, de-duplicated addresses (see members.py)
+    return _cached("members", member_file, lambda: read_member_emails(member_file))
+
+def read_form_source(form_file, scan_rows=HEADER_SCAN_ROWS, threshold=HEADER_THRESHOLD):
+    key = ("form", scan_rows, threshold)
+    return _cached(key, form_file, lambda: ingest_form_source(form_file, scan_rows, threshold)).frame.copy()
+
+def _by_column(by_index, df_columns):
+    return {df_columns[i]: value for i, value in by_index.items() if 0 <= i < len(df_columns)}
+
+def detect_dropdowns(excel_file, df_columns, scan_rows=HEADER_SCAN_ROWS, threshold=HEADER_THRESHOLD):
+    key = ("form", scan_rows, threshold)
+    by_index = _cached(key, excel_file, lambda: ingest_form_source(excel_file, scan_rows, threshold)).dropdowns
+    return {col: list(options) for col, options in _by_column(by_index, df_columns).items()}
+
+def detect_validations(excel_file, df_columns, scan_rows=HEADER_SCAN_ROWS, threshold=HEADER_THRESHOLD):
+    key = ("form", scan_rows, threshold)
+    by_index = _cached(key, excel_file, lambda: ingest_form_source(excel_file, scan_rows, threshold)).validations
+    return {col: dict(rule) for col, rule in _by_column(by_index, df_columns).items()}
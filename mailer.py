@@ -0,0 +1,235 @@
+import smtplib
+import threading
+import queue
+import time
+import random
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+# ----------------------------
+# Mailer
+# ----------------------------
+# One authenticated SMTP connection is kept per sender and reused for every
+# recipient of a batch (and across Streamlit reruns). A dropped connection is
+# re-opened transparently and the message is retried once on the new one.
+#
+# Large batches are spread over a small pool of worker connections, paced by a
+# shared messages-per-second token bucket and a cap on concurrent sends per
+# recipient provider (domain). Results are streamed back to the caller's
+# thread as they complete so the UI can update while sending.
+#
+# Failures are classified as transient (4xx replies, dropped connections,
+# network errors) or permanent (5xx replies, bad addresses). Transient ones
+# are re-queued after a jittered exponential backoff, without holding up a
+# worker, until max_retries is reached. Failures of the sender rather than of
+# a recipient (rejected login, refused sender, sending quota) are classified
+# as "sender": they stop the run, and every recipient not yet sent is reported
+# with that error so the caller can keep them for a later attempt.
+
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 587
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 5.0
+DEFAULT_PER_PROVIDER = 2
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 2.0
+DEFAULT_MAX_BACKOFF = 60.0
+
+_RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+_SENDER_ERRORS = (smtplib.SMTPAuthenticationError, smtplib.SMTPSenderRefused)
+_SENDER_LIMIT_MARKERS = (b"5.4.5", b"quota")
+
+def build_message(sender, to_email, subject, message):
+    msg = MIMEMultipart()
+    msg["From"] = sender
+    msg["To"] = to_email
+    msg["Subject"] = subject
+    msg.attach(MIMEText(message, "plain"))
+    return msg
+
+
+class SMTPConnection:
+    def __init__(self, sender, password, host=SMTP_HOST, port=SMTP_PORT, timeout=30):
+        self.sender = sender
+        self.password = password
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._server = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        server.ehlo()
+        server.starttls()
+        server.ehlo()
+        server.login(self.sender, self.password)
+        self._server = server
+
+    def _drop(self):
+        server, self._server = self._server, None
+        if server is not None:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def send(self, msg):
+        with self._lock:
+            if self._server is None:
+                self._connect()
+            try:
+                self._server.send_message(msg)
+            except _RECONNECT_ERRORS:
+                self._drop()
+                self._connect()
+                self._server.send_message(msg)
+
+    def close(self):
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except Exception:
+                    pass
+            self._drop()
+
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+def get_connection(sender, password, host=SMTP_HOST, port=SMTP_PORT, slot=0):
+    key = (host, port, sender, slot)
+    with _connections_lock:
+        conn = _connections.get(key)
+        if conn is not None and conn.password != password:
+            conn.close()
+            conn = None
+        if conn is None:
+            conn = SMTPConnection(sender, password, host, port)
+            _connections[key] = conn
+        return conn
+
+def provider_of(email):
+    return str(email).rsplit("@", 1)[-1].strip().lower()
+
+def classify_error(exc):
+    if isinstance(exc, _SENDER_ERRORS):
+        return "sender"
+    if isinstance(exc, smtplib.SMTPResponseException) and isinstance(exc.smtp_error, bytes) \
+            and any(m in exc.smtp_error.lower() for m in _SENDER_LIMIT_MARKERS):
+        return "sender"
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in exc.recipients.values()]
+        return "transient" if codes and all(400 <= code < 500 for code in codes) else "permanent"
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return "transient" if 400 <= exc.smtp_code < 500 else "permanent"
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return "transient"
+    if isinstance(exc, smtplib.SMTPException):
+        return "permanent"
+    if isinstance(exc, OSError):
+        return "transient"
+    return "permanent"
+
+def backoff_delay(attempt, base=DEFAULT_BACKOFF, cap=DEFAULT_MAX_BACKOFF):
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def _result(email, error=None, attempts=1):
+    if error is None:
+        return {"Email": email, "Status": "✅ Sent", "Attempts": attempts, "ErrorKind": None}
+    return {"Email": email, "Status": f"❌ Failed ({error})", "Attempts": attempts, "ErrorKind": classify_error(error)}
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def stream_send(sender, password, recipients, subject, message, workers=DEFAULT_WORKERS,
+                rate=DEFAULT_RATE, per_provider=DEFAULT_PER_PROVIDER, max_retries=DEFAULT_MAX_RETRIES,
+                backoff=DEFAULT_BACKOFF, host=SMTP_HOST, port=SMTP_PORT):
+    # Yields (index, result) in completion order, one final result per
+    # recipient; must be consumed by the caller. message may be a callable
+    # taking the recipient's index, for personalised bodies.
+    recipients = list(recipients)
+    if not recipients:
+        return
+    todo = queue.Queue()
+    for i, email in enumerate(recipients):
+        todo.put((i, email, 1))
+    outstanding = [len(recipients)]
+    outstanding_lock = threading.Lock()
+    done = queue.Queue()
+    bucket = TokenBucket(rate) if rate else None
+    providers = {}
+    providers_lock = threading.Lock()
+    sender_error = []
+
+    def provider_slot(email):
+        with providers_lock:
+            return providers.setdefault(provider_of(email), threading.BoundedSemaphore(per_provider))
+
+    def finish(i, res):
+        with outstanding_lock:
+            outstanding[0] -= 1
+        done.put((i, res))
+
+    def worker(slot):
+        conn = get_connection(sender, password, host, port, slot=slot)
+        while True:
+            try:
+                i, email, attempt = todo.get(timeout=0.2)
+            except queue.Empty:
+                with outstanding_lock:
+                    if outstanding[0] == 0:
+                        return
+                continue
+            if sender_error:
+                finish(i, _result(email, sender_error[0], attempt))
+                continue
+            error = None
+            sem = provider_slot(email) if per_provider else None
+            if sem is not None:
+                sem.acquire()
+            try:
+                if bucket is not None:
+                    bucket.acquire()
+                body = message(i) if callable(message) else message
+                conn.send(build_message(sender, email, subject, body))
+            except Exception as e:
+                error = e
+                if classify_error(e) == "sender":
+                    # Bad credentials or a refused sender fail every recipient the same way; don't hammer the server
+                    sender_error.append(e)
+            finally:
+                if sem is not None:
+                    sem.release()
+            if error is not None and not sender_error and attempt <= max_retries and classify_error(error) == "transient":
+                retry = threading.Timer(backoff_delay(attempt, backoff), todo.put, args=((i, email, attempt + 1),))
+                retry.daemon = True
+                retry.start()
+                continue
+            finish(i, _result(email, error, attempt))
+
+    for slot in range(max(1, min(workers, len(recipients)))):
+        threading.Thread(target=worker, args=(slot,), name=f"smtp-worker-{slot}", daemon=True).start()
+    for _ in range(len(recipients)):
+        yield done.get()
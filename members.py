@@ -0,0 +1,145 @@
+import os
+import csv
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from openpyxl import load_workbook
+
+# ----------------------------
+# Member Lists
+# ----------------------------
+# Member files (XLSX or CSV, up to hundreds of thousands of rows) are read in
+# chunks, and only the Email column is kept. Each chunk is normalised
+# (trimmed, domain lower-cased) and syntax-checked with vectorized string
+# operations, and duplicates are dropped across the whole file: "John@X.com "
+# and "john@x.com" are the same member. Malformed addresses are rejected here
+# instead of costing an SMTP round-trip each.
+#
+# Optionally, recipient domains can be checked for mail servers (MX, falling
+# back to A records) before sending. This needs the 'dnspython' package, and
+# results are cached per domain.
+
+EMAIL_COLUMN = "Email"
+MEMBER_CHUNK_ROWS = 50000
+MX_CACHE_SECONDS = 3600
+MX_LOOKUP_WORKERS = 16
+MX_LOOKUP_TIMEOUT = 5.0
+
+EMAIL_SYNTAX_RE = (
+    r"^[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,63}$"
+)
+
+MemberList = namedtuple("MemberList", ["columns", "emails", "total", "duplicates", "rejected"])
+
+def _is_csv(member_file):
+    name = getattr(member_file, "name", "") or ""
+    return os.path.splitext(name)[1].lower() == ".csv"
+
+def _xlsx_chunks(member_file, chunk_size):
+    wb = load_workbook(member_file, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [None if v is None else str(v).strip() for v in next(rows, ())]
+        yield header, None
+        if EMAIL_COLUMN not in header:
+            return
+        col = header.index(EMAIL_COLUMN)
+        chunk = []
+        for row in rows:
+            chunk.append(row[col] if col < len(row) else None)
+            if len(chunk) >= chunk_size:
+                yield header, pd.Series(chunk, dtype="object")
+                chunk = []
+        if chunk:
+            yield header, pd.Series(chunk, dtype="object")
+    finally:
+        wb.close()
+
+def _csv_chunks(member_file, chunk_size):
+    header = next(csv.reader([member_file.readline().decode("utf-8-sig")]), [])
+    header = [h.strip() for h in header]
+    member_file.seek(0)
+    yield header, None
+    if EMAIL_COLUMN not in header:
+        return
+    for chunk in pd.read_csv(member_file, usecols=[header.index(EMAIL_COLUMN)], dtype=str,
+                             chunksize=chunk_size, encoding="utf-8-sig", keep_default_na=False):
+        yield header, chunk.iloc[:, 0]
+
+def normalize_emails(series):
+    # Trimmed, mailto:/angle brackets dropped, domain lower-cased
+    text = series.astype("string").str.strip().str.replace(r"(?i)^<?(?:mailto:)?<?|>$", "", regex=True)
+    parts = text.str.rpartition("@")
+    return parts[0].str.cat(parts[1]).str.cat(parts[2].str.lower())
+
+def read_member_emails(member_file, chunk_size=MEMBER_CHUNK_ROWS):
+    member_file.seek(0)
+    chunks = _csv_chunks(member_file, chunk_size) if _is_csv(member_file) else _xlsx_chunks(member_file, chunk_size)
+    columns = []
+    valid_chunks = []
+    rejected = []
+    total = 0
+    for header, chunk in chunks:
+        columns = header
+        if chunk is None:
+            continue
+        emails_in = normalize_emails(chunk)
+        emails_in = emails_in[emails_in.notna() & (emails_in != "")]
+        total += len(emails_in)
+        valid = emails_in.str.match(EMAIL_SYNTAX_RE).fillna(False).astype(bool)
+        if (~valid).any():
+            rejected.append(pd.DataFrame({"Email": emails_in[~valid].astype(object), "Reason": "invalid address"}))
+        valid_chunks.append(emails_in[valid])
+    emails = pd.concat(valid_chunks, ignore_index=True) if valid_chunks else pd.Series(dtype="string")
+    # Mailbox names are case-insensitive in practice, so case variants are one member
+    first = ~emails.str.casefold().duplicated()
+    rejected = pd.concat(rejected, ignore_index=True) if rejected else pd.DataFrame(columns=["Email", "Reason"])
+    return MemberList(columns, emails[first].tolist(), total, int((~first).sum()), rejected)
+
+# ----------------------------
+# Deliverability (optional)
+# ----------------------------
+_mx_cache = {}
+
+def _domain_accepts_mail(domain):
+    import dns.resolver
+    import dns.exception
+    for record in ("MX", "A"):
+        try:
+            dns.resolver.resolve(domain, record, lifetime=MX_LOOKUP_TIMEOUT)
+            return True
+        except dns.resolver.NXDOMAIN:
+            return False
+        except dns.resolver.NoAnswer:
+            continue
+        except (dns.exception.Timeout, dns.resolver.NoNameservers):
+            # Unknown (no resolver answered) is not the same as undeliverable;
+            # don't cache it for long
+            return None
+    return False
+
+def deliverability_available():
+    try:
+        import dns.resolver  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def filter_deliverable(emails):
+    # Returns (deliverable emails, DataFrame of addresses whose domain has no mail server)
+    try:
+        import dns.resolver  # noqa: F401
+    except ImportError:
+        raise RuntimeError("Domain checks need the 'dnspython' package (pip install dnspython)")
+    domains = pd.Series(emails, dtype="object").str.rpartition("@")[2]
+    now = time.monotonic()
+    unknown = [d for d in domains.unique() if d not in _mx_cache or _mx_cache[d][1] < now]
+    with ThreadPoolExecutor(MX_LOOKUP_WORKERS) as pool:
+        for domain, ok in zip(unknown, pool.map(_domain_accepts_mail, unknown)):
+            _mx_cache[domain] = (ok is not False, now + (MX_CACHE_SECONDS if ok is not None else 60))
+    accepted = domains.map(lambda d: _mx_cache[d][0]).astype(bool).to_numpy()
+    emails = pd.Series(emails, dtype="object")
+    rejected = pd.DataFrame({"Email": emails[~accepted], "Reason": "domain has no mail server"})
+    return emails[accepted].tolist(), rejected.reset_index(drop=True)
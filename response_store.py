@@ -0,0 +1,767 @@
+import os
+import json
+import threading
+import queue
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, namedtuple
+from datetime import datetime
+import pandas as pd
+from storage import connect
+
+# ----------------------------
+# Response Storage
+# ----------------------------
+# Submissions are appended as single records instead of rewriting the whole
+# workbook, so a submit costs the same no matter how many responses exist.
+# XLSX is only produced when someone exports.
+#
+# All writes go through one writer thread per store. Concurrent submits are
+# queued, batched and committed in a single transaction (one fsync per batch),
+# and each caller waits until its own row is durable before returning.
+# Several processes may share one database file; SQLite's locking orders
+# their writer threads' transactions.
+#
+# Rows are stored compactly: each distinct column list a form submits is
+# registered once as a layout, and a row only holds its values in layout
+# order. A form's layouts are its schema versions, so renaming a field is an
+# update of its layouts rather than of every row, and a form's rows never
+# carry other forms' columns. Unified, all-forms views are assembled only
+# when they are read.
+#
+# Admin edits and deletes address a single row by its ResponseID and go
+# through the same writer, so they never rewrite other rows or race with
+# submissions. The previous values of every changed or deleted row are kept
+# in an audit log.
+#
+# Per-form statistics (responses, distinct invited respondents, answers per
+# field, submissions per day and, for option fields, answers per option per
+# day) are kept as counters updated in the same transaction as each write, so
+# reading them costs the same no matter how many responses a form has.
+
+FormStats = namedtuple("FormStats", ["responses", "respondents", "answered", "daily", "options"])
+
+def _json_default(value):
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+def _clean_value(value):
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value
+
+def _answer(value):
+    # The text an answer is counted under, or None for a blank answer
+    value = _clean_value(value)
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+def _day(submitted_at):
+    # Counter key for a submission's day; '' for undated rows, since NULLs
+    # never match in a primary key and would add a row per update
+    return (submitted_at or "")[:10]
+
+def _encode_values(row):
+    return json.dumps([_clean_value(v) for v in row.values()], ensure_ascii=False, default=_json_default)
+
+
+class ResponseStore(ABC):
+    # What the app needs from a response backend (see BACKENDS)
+    @abstractmethod
+    def append(self, row):
+        raise NotImplementedError
+
+    @abstractmethod
+    def load(self, form_id=None, limit=None, since_id=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_page(self, form_id, page, page_size, page_ends):
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self, form_id=None, since_id=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def max_id(self, form_id=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def respondents(self, form_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_rows(self, form_id=None, chunk_size=5000):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_records(self, form_id=None, since_id=None, chunk_size=5000):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_frames(self, form_id=None, chunk_size=50000):
+        raise NotImplementedError
+
+    @abstractmethod
+    def version(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def generation(self, form_id=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def track_options(self, form_id, fields):
+        raise NotImplementedError
+
+    @abstractmethod
+    def rename_field(self, form_id, old, new):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, response_id, changes, actor=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, response_id, actor=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def history(self, form_id=None, limit=100):
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self, form_id):
+        raise NotImplementedError
+
+
+class _WriteRequest:
+    def __init__(self, op, payload):
+        self.op = op
+        self.payload = payload
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.state = "queued"
+        self._lock = threading.Lock()
+
+    def claim(self):
+        # Writer side: False when the submitter already gave up on the request
+        with self._lock:
+            if self.state == "cancelled":
+                return False
+            self.state = "running"
+            return True
+
+    def cancel(self):
+        # Submitter side: False when the writer already started the request
+        with self._lock:
+            if self.state == "running":
+                return False
+            self.state = "cancelled"
+            return True
+
+
+class SQLiteResponseStore(ResponseStore):
+    def __init__(self, db_path, legacy_xlsx=None, form_key="FormID", time_key="SubmittedAt", respondent_key="RespondentToken",
+                 batch_size=500, batch_window=0.005, write_timeout=30):
+        self.db_path = db_path
+        self.form_key = form_key
+        self.time_key = time_key
+        self.respondent_key = respondent_key
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.write_timeout = write_timeout
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._layout_ids = {}
+        self._layout_columns = {}
+        self._layout_generation = None
+        self._init_schema()
+        if legacy_xlsx:
+            self._import_legacy(legacy_xlsx)
+        self._init_stats()
+        self._writer = threading.Thread(target=self._writer_loop, name=f"response-writer:{os.path.basename(db_path)}", daemon=True)
+        self._writer.start()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.db_path, synchronous="NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "form_id TEXT, "
+                "submitted_at TEXT, "
+                "data TEXT NOT NULL)"
+            )
+            # Per-form reads (ordered by id) and per-form time ranges stay index lookups
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_form ON responses(form_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_form_time ON responses(form_id, submitted_at)")
+            # Invited members' responses carry their recipient token (see tokens.py)
+            columns = [r[1] for r in conn.execute("PRAGMA table_info(responses)")]
+            if "respondent" not in columns:
+                conn.execute("ALTER TABLE responses ADD COLUMN respondent TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_form_respondent ON responses(form_id, respondent)")
+            # Rows written before layouts existed keep layout NULL and a JSON object as data
+            if "layout" not in columns:
+                conn.execute("ALTER TABLE responses ADD COLUMN layout INTEGER")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS layouts ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, form_id TEXT NOT NULL, columns TEXT NOT NULL, UNIQUE (form_id, columns))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_audit ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, response_id INTEGER, form_id TEXT, action TEXT, "
+                "previous TEXT, changes TEXT, actor TEXT, at TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_response_audit_form ON response_audit(form_id, id)")
+            # Bumped by row edits so only that form's snapshot is rebuilt
+            conn.execute("CREATE TABLE IF NOT EXISTS form_generations (form_id TEXT PRIMARY KEY, generation INTEGER)")
+            conn.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("INSERT OR IGNORE INTO store_meta (key, value) VALUES ('version', '0')")
+            conn.execute("INSERT OR IGNORE INTO store_meta (key, value) VALUES ('generation', '0')")
+
+    def _record(self, row):
+        form_id = _clean_value(row.get(self.form_key))
+        submitted_at = _clean_value(row.get(self.time_key))
+        respondent = _clean_value(row.get(self.respondent_key))
+        return (
+            None if form_id is None else str(form_id),
+            None if submitted_at is None else str(submitted_at),
+            None if respondent is None else str(respondent),
+            tuple(str(k) for k in row),
+            _encode_values(row),
+        )
+
+    # ----------------------------
+    # Layouts
+    # ----------------------------
+    def _layout_id(self, conn, form_id, columns):
+        key = (form_id or "", columns)
+        layout = self._layout_ids.get(key)
+        if layout is None:
+            text = json.dumps(list(columns), ensure_ascii=False)
+            conn.execute("INSERT OR IGNORE INTO layouts (form_id, columns) VALUES (?,?)", key[:1] + (text,))
+            layout = conn.execute("SELECT id FROM layouts WHERE form_id=? AND columns=?", key[:1] + (text,)).fetchone()[0]
+            self._layout_ids[key] = layout
+        return layout
+
+    def _insert(self, conn, records):
+        # records are _record() tuples
+        rows = [
+            (form_id, submitted_at, respondent, self._layout_id(conn, form_id, columns), data)
+            for form_id, submitted_at, respondent, columns, data in records
+        ]
+        sql = "INSERT INTO responses (form_id, submitted_at, respondent, layout, data) VALUES (?,?,?,?,?)"
+        if len(rows) == 1:
+            # execute, not executemany, so the cursor carries the new ResponseID
+            return conn.execute(sql, rows[0])
+        return conn.executemany(sql, rows)
+
+    def _fresh_layouts(self, conn):
+        # Renames rewrite layouts and bump the generation; cached columns are dropped then
+        generation = int(conn.execute("SELECT value FROM store_meta WHERE key='generation'").fetchone()[0])
+        if generation != self._layout_generation:
+            self._layout_columns = {}
+            self._layout_ids = {}
+            self._layout_generation = generation
+
+    def _decode(self, conn, layout, data):
+        values = json.loads(data)
+        if layout is None:
+            return values
+        columns = self._layout_columns.get(layout)
+        if columns is None:
+            self._layout_columns = {lid: json.loads(c) for lid, c in conn.execute("SELECT id, columns FROM layouts")}
+            columns = self._layout_columns[layout]
+        return dict(zip(columns, values))
+
+    def _rename_layouts(self, conn, form_id, old, new):
+        # Legacy object rows of the form move to layouts first, so the rename covers them
+        legacy = conn.execute("SELECT id, data FROM responses WHERE form_id=? AND layout IS NULL", (form_id,)).fetchall()
+        for rid, data in legacy:
+            row = json.loads(data)
+            layout = self._layout_id(conn, form_id, tuple(str(k) for k in row))
+            conn.execute("UPDATE responses SET layout=?, data=? WHERE id=?", (layout, _encode_values(row), rid))
+        layouts = conn.execute("SELECT id, columns FROM layouts WHERE form_id=?", (form_id,)).fetchall()
+        texts = {c: lid for lid, c in layouts}
+        for lid, text in layouts:
+            columns = json.loads(text)
+            if old not in columns:
+                continue
+            if new in columns:
+                raise ValueError(f"Responses of this form already have a '{new}' field")
+            renamed = json.dumps([new if c == old else c for c in columns], ensure_ascii=False)
+            if renamed in texts:
+                # Same column list as an existing layout: its rows join that one
+                conn.execute("UPDATE responses SET layout=? WHERE layout=?", (texts[renamed], lid))
+                conn.execute("DELETE FROM layouts WHERE id=?", (lid,))
+            else:
+                conn.execute("UPDATE layouts SET columns=? WHERE id=?", (renamed, lid))
+                texts[renamed] = lid
+        # Counters move to the new name, merging with any it already had
+        conn.execute(
+            "INSERT INTO stats_fields (form_id, field, answered) SELECT form_id, ?, answered FROM stats_fields "
+            "WHERE form_id=? AND field=? ON CONFLICT(form_id, field) DO UPDATE SET answered=answered+excluded.answered",
+            (new, form_id, old),
+        )
+        conn.execute(
+            "INSERT INTO stats_options (form_id, field, value, day, responses) SELECT form_id, ?, value, day, responses "
+            "FROM stats_options WHERE form_id=? AND field=? "
+            "ON CONFLICT(form_id, field, day, value) DO UPDATE SET responses=responses+excluded.responses",
+            (new, form_id, old),
+        )
+        conn.execute("UPDATE OR IGNORE stats_tracked SET field=? WHERE form_id=? AND field=?", (new, form_id, old))
+        for table in ("stats_fields", "stats_options", "stats_tracked"):
+            conn.execute(f"DELETE FROM {table} WHERE form_id=? AND field=?", (form_id, old))
+
+    def _import_legacy(self, xlsx_path):
+        conn = self._conn()
+        if not os.path.exists(xlsx_path):
+            return
+        with conn:
+            # Checked under the write lock so concurrent processes import once
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT value FROM store_meta WHERE key='legacy_imported'").fetchone():
+                return
+            df = pd.read_excel(xlsx_path)
+            # The sheet is the union of every form's columns; each row keeps only its own cells
+            records = [{k: v for k, v in r.items() if pd.notna(v)} for r in df.to_dict("records")]
+            self._insert(conn, [self._record(r) for r in records])
+            conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('legacy_imported', ?)", (xlsx_path,))
+            conn.execute("DELETE FROM store_meta WHERE key='stats_built'")
+
+    # ----------------------------
+    # Statistics
+    # ----------------------------
+    def _init_stats(self):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats_totals (form_id TEXT PRIMARY KEY, responses INTEGER, respondents INTEGER)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats_fields (form_id TEXT, field TEXT, answered INTEGER, PRIMARY KEY (form_id, field))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats_daily (form_id TEXT, day TEXT NOT NULL DEFAULT '', responses INTEGER, "
+                "PRIMARY KEY (form_id, day))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats_options (form_id TEXT, field TEXT, value TEXT, day TEXT NOT NULL DEFAULT '', "
+                "responses INTEGER, "
+                "PRIMARY KEY (form_id, field, day, value))"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS stats_tracked (form_id TEXT, field TEXT, PRIMARY KEY (form_id, field))")
+        with conn:
+            # Databases from before statistics existed are counted once, by one
+            # process; so are counters that were keyed by a NULL day
+            conn.execute("BEGIN IMMEDIATE")
+            null_days = conn.execute(
+                "SELECT 1 FROM stats_daily WHERE day IS NULL UNION ALL SELECT 1 FROM stats_options WHERE day IS NULL LIMIT 1"
+            ).fetchone()
+            if null_days or not conn.execute("SELECT value FROM store_meta WHERE key='stats_built'").fetchone():
+                self._recount(conn)
+                conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('stats_built', '1')")
+
+    def _tracked(self, conn, form_id):
+        return [r[0] for r in conn.execute("SELECT field FROM stats_tracked WHERE form_id=?", (form_id,))]
+
+    def _count(self, conn, form_id, submitted_at, respondent_delta, row, sign):
+        # Adds (sign=1) or removes (sign=-1) one response from its form's counters
+        if form_id is None:
+            return
+        day = _day(submitted_at)
+        answers = {str(k): _answer(v) for k, v in row.items()}
+        conn.execute(
+            "INSERT INTO stats_totals (form_id, responses, respondents) VALUES (?,?,?) ON CONFLICT(form_id) DO UPDATE SET "
+            "responses=responses+excluded.responses, respondents=respondents+excluded.respondents",
+            (form_id, sign, respondent_delta),
+        )
+        conn.execute(
+            "INSERT INTO stats_daily (form_id, day, responses) VALUES (?,?,?) ON CONFLICT(form_id, day) DO UPDATE SET "
+            "responses=responses+excluded.responses",
+            (form_id, day, sign),
+        )
+        conn.executemany(
+            "INSERT INTO stats_fields (form_id, field, answered) VALUES (?,?,?) ON CONFLICT(form_id, field) DO UPDATE SET "
+            "answered=answered+excluded.answered",
+            [(form_id, k, sign) for k, v in answers.items() if v is not None],
+        )
+        conn.executemany(
+            "INSERT INTO stats_options (form_id, field, value, day, responses) VALUES (?,?,?,?,?) "
+            "ON CONFLICT(form_id, field, day, value) DO UPDATE SET responses=responses+excluded.responses",
+            [(form_id, k, answers[k], day, sign) for k in self._tracked(conn, form_id) if answers.get(k) is not None],
+        )
+
+    def _count_options(self, conn, form_id, fields):
+        counts = Counter()
+        rows = conn.execute("SELECT submitted_at, layout, data FROM responses WHERE form_id=?", (form_id,))
+        for submitted_at, layout, data in rows:
+            row = self._decode(conn, layout, data)
+            day = _day(submitted_at)
+            for field in fields:
+                value = _answer(row.get(field))
+                if value is not None:
+                    counts[(form_id, field, value, day)] += 1
+        return [key + (n,) for key, n in counts.items()]
+
+    def _recount(self, conn):
+        # Rebuilds every counter from the stored rows (first start, legacy imports)
+        for table in ("stats_totals", "stats_fields", "stats_daily", "stats_options"):
+            conn.execute(f"DELETE FROM {table}")
+        totals, respondents, fields, daily = Counter(), {}, Counter(), Counter()
+        for form_id, submitted_at, respondent, layout, data in conn.execute(
+                "SELECT form_id, submitted_at, respondent, layout, data FROM responses WHERE form_id IS NOT NULL"):
+            totals[form_id] += 1
+            respondents.setdefault(form_id, set())
+            if respondent is not None:
+                respondents[form_id].add(respondent)
+            daily[(form_id, _day(submitted_at))] += 1
+            for k, v in self._decode(conn, layout, data).items():
+                if _answer(v) is not None:
+                    fields[(form_id, str(k))] += 1
+        conn.executemany(
+            "INSERT INTO stats_totals (form_id, responses, respondents) VALUES (?,?,?)",
+            [(f, n, len(respondents[f])) for f, n in totals.items()],
+        )
+        conn.executemany("INSERT INTO stats_fields (form_id, field, answered) VALUES (?,?,?)", [k + (n,) for k, n in fields.items()])
+        conn.executemany("INSERT INTO stats_daily (form_id, day, responses) VALUES (?,?,?)", [k + (n,) for k, n in daily.items()])
+        for form_id in totals:
+            conn.executemany(
+                "INSERT INTO stats_options (form_id, field, value, day, responses) VALUES (?,?,?,?,?)",
+                self._count_options(conn, form_id, self._tracked(conn, form_id)),
+            )
+
+    def track_options(self, form_id, fields):
+        # Starts counting answers per option for these fields (existing rows included)
+        fields = [str(f) for f in fields]
+        if set(fields) <= set(self._tracked(self._conn(), form_id)):
+            return
+        self._submit("track", (form_id, fields))
+
+    def stats(self, form_id):
+        conn = self._conn()
+        totals = conn.execute("SELECT responses, respondents FROM stats_totals WHERE form_id=?", (form_id,)).fetchone() or (0, 0)
+        answered = pd.Series(
+            dict(conn.execute("SELECT field, answered FROM stats_fields WHERE form_id=? AND answered>0", (form_id,))),
+            dtype="int64", name="Answered",
+        )
+        daily = pd.Series(
+            dict(conn.execute("SELECT day, responses FROM stats_daily WHERE form_id=? AND day!='' AND responses>0 ORDER BY day", (form_id,))),
+            dtype="int64", name="Responses",
+        )
+        options = pd.DataFrame(
+            conn.execute(
+                "SELECT field, value, NULLIF(day, ''), responses FROM stats_options WHERE form_id=? AND responses>0", (form_id,)
+            ).fetchall(),
+            columns=["Field", "Option", "Day", "Responses"],
+        )
+        return FormStats(totals[0], totals[1], answered, daily, options)
+
+    # ----------------------------
+    # Single writer
+    # ----------------------------
+    def _submit(self, op, payload):
+        req = _WriteRequest(op, payload)
+        self._queue.put(req)
+        if not req.done.wait(self.write_timeout):
+            if req.cancel():
+                raise TimeoutError("Response store writer is busy; the write was not saved")
+            # Already inside a transaction, so its outcome is decided; wait for it
+            req.done.wait()
+        if req.error is not None:
+            raise req.error
+        return req.result
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _apply(self, conn, req):
+        self._fresh_layouts(conn)
+        if req.op == "track":
+            form_id, fields = req.payload
+            fields = [f for f in dict.fromkeys(fields) if f not in self._tracked(conn, form_id)]
+            conn.executemany("INSERT INTO stats_tracked (form_id, field) VALUES (?,?)", [(form_id, f) for f in fields])
+            conn.executemany(
+                "INSERT INTO stats_options (form_id, field, value, day, responses) VALUES (?,?,?,?,?)",
+                self._count_options(conn, form_id, fields),
+            )
+            return None
+        if req.op == "append":
+            record = self._record(req.payload)
+            form_id, submitted_at, respondent = record[:3]
+            first_response = respondent is not None and conn.execute(
+                "SELECT 1 FROM responses WHERE form_id=? AND respondent=? LIMIT 1", (form_id, respondent)
+            ).fetchone() is None
+            cur = self._insert(conn, [record])
+            self._count(conn, form_id, submitted_at, int(first_response), req.payload, 1)
+            result = cur.lastrowid
+        elif req.op in ("update", "delete"):
+            result = self._change(conn, req.op, *req.payload)
+        elif req.op == "rename":
+            self._rename_layouts(conn, *req.payload)
+            conn.execute("UPDATE store_meta SET value = CAST(value AS INTEGER) + 1 WHERE key='generation'")
+            result = None
+        else:
+            raise ValueError(f"Unknown write operation '{req.op}'")
+        # Bumped with every write so readers can tell when cached exports are stale
+        conn.execute("UPDATE store_meta SET value = CAST(value AS INTEGER) + 1 WHERE key='version'")
+        return result
+
+    def _writer_loop(self):
+        conn = connect(self.db_path, synchronous="FULL")
+        while True:
+            batch = [req for req in self._next_batch() if req.claim()]
+            if not batch:
+                continue
+            try:
+                with conn:
+                    # Take the write lock up front: the reads in _apply (first response
+                    # per respondent, layouts) must not race other processes' writers
+                    conn.execute("BEGIN IMMEDIATE")
+                    results = [self._apply(conn, req) for req in batch]
+            except Exception:
+                # Group commit failed; replay one by one so only the bad request errors.
+                # Layouts registered in the rolled-back transaction are gone too.
+                self._layout_ids = {}
+                results = []
+                for req in batch:
+                    try:
+                        with conn:
+                            conn.execute("BEGIN IMMEDIATE")
+                            results.append(self._apply(conn, req))
+                    except Exception as e:
+                        self._layout_ids = {}
+                        req.error = e
+                        results.append(None)
+            for req, result in zip(batch, results):
+                req.result = result
+                req.done.set()
+
+    def append(self, row):
+        return self._submit("append", row)
+
+    def rename_field(self, form_id, old, new):
+        # Renames a field in every stored response of the form, one update per layout
+        self._submit("rename", (form_id, str(old), str(new)))
+
+    def update(self, response_id, changes, actor=None):
+        # Changes only the given fields of one response; returns the updated row
+        return self._submit("update", (int(response_id), dict(changes), actor))
+
+    def delete(self, response_id, actor=None):
+        # Deletes one response; returns the row as it was
+        return self._submit("delete", (int(response_id), None, actor))
+
+    def _has_respondent(self, conn, form_id, respondent):
+        return conn.execute(
+            "SELECT 1 FROM responses WHERE form_id=? AND respondent=? LIMIT 1", (form_id, respondent)
+        ).fetchone() is not None
+
+    def _change(self, conn, op, response_id, changes, actor):
+        old = conn.execute(
+            "SELECT form_id, submitted_at, respondent, layout, data FROM responses WHERE id=?", (response_id,)
+        ).fetchone()
+        if old is None:
+            raise KeyError(f"No response with ID {response_id}")
+        form_id, submitted_at, respondent, layout, data = old
+        previous = self._decode(conn, layout, data)
+        row = None
+        if op == "delete":
+            conn.execute("DELETE FROM responses WHERE id=?", (response_id,))
+        else:
+            row = dict(previous, **changes)
+            record = self._record(row)
+            conn.execute(
+                "UPDATE responses SET form_id=?, submitted_at=?, respondent=?, layout=?, data=? WHERE id=?",
+                record[:3] + (self._layout_id(conn, record[0], record[3]), record[4], response_id),
+            )
+        # Counters: the old row comes out, the new one (if any) goes in
+        new_respondent = None if row is None else record[2]
+        gone = respondent is not None and respondent != new_respondent and not self._has_respondent(conn, form_id, respondent)
+        self._count(conn, form_id, submitted_at, -int(gone), previous, -1)
+        if row is not None:
+            first = new_respondent is not None and new_respondent != respondent and conn.execute(
+                "SELECT COUNT(*) FROM responses WHERE form_id=? AND respondent=?", (record[0], new_respondent)
+            ).fetchone()[0] == 1
+            self._count(conn, record[0], record[1], int(first), row, 1)
+        conn.execute(
+            "INSERT INTO response_audit (response_id, form_id, action, previous, changes, actor, at) VALUES (?,?,?,?,?,?,?)",
+            (response_id, form_id, op, json.dumps(previous, ensure_ascii=False, default=_json_default),
+             None if changes is None else json.dumps({k: _clean_value(v) for k, v in changes.items()},
+                                                     ensure_ascii=False, default=_json_default),
+             actor, datetime.now().isoformat(timespec="seconds")),
+        )
+        for changed_form in {form_id, None if row is None else record[0]} - {None}:
+            conn.execute(
+                "INSERT INTO form_generations (form_id, generation) VALUES (?, 1) "
+                "ON CONFLICT(form_id) DO UPDATE SET generation=generation+1",
+                (changed_form,),
+            )
+        return previous if row is None else row
+
+    def history(self, form_id=None, limit=100):
+        # Most recent edits and deletes first, with the values they replaced
+        where, args = ("", []) if form_id is None else (" WHERE form_id=?", [form_id])
+        rows = self._conn().execute(
+            "SELECT id, response_id, action, changes, previous, actor, at FROM response_audit" + where +
+            " ORDER BY id DESC LIMIT ?", args + [limit],
+        ).fetchall()
+        return pd.DataFrame(rows, columns=["AuditID", "ResponseID", "Action", "Changes", "Previous", "By", "At"])
+
+    # ----------------------------
+    # Reads
+    # ----------------------------
+    def _where(self, form_id=None, since_id=None):
+        clauses, args = [], []
+        if form_id is not None:
+            clauses.append("form_id=?")
+            args.append(form_id)
+        if since_id is not None:
+            clauses.append("id>?")
+            args.append(since_id)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def count(self, form_id=None, since_id=None):
+        where, args = self._where(form_id, since_id)
+        return self._conn().execute("SELECT COUNT(*) FROM responses" + where, args).fetchone()[0]
+
+    def max_id(self, form_id=None):
+        where, args = self._where(form_id)
+        return self._conn().execute("SELECT COALESCE(MAX(id), 0) FROM responses" + where, args).fetchone()[0]
+
+    def respondents(self, form_id):
+        # Recipient tokens that have responded to the form (index-only scan)
+        rows = self._conn().execute(
+            "SELECT DISTINCT respondent FROM responses WHERE form_id=? AND respondent IS NOT NULL", (form_id,)
+        )
+        return {r[0] for r in rows}
+
+    def version(self):
+        return int(self._conn().execute("SELECT value FROM store_meta WHERE key='version'").fetchone()[0])
+
+    def generation(self, form_id=None):
+        # Moves whenever stored rows change in place (not on appends); with a
+        # form_id, row edits of other forms don't count
+        conn = self._conn()
+        generation = int(conn.execute("SELECT value FROM store_meta WHERE key='generation'").fetchone()[0])
+        where, args = self._where(form_id)
+        edits = conn.execute("SELECT COALESCE(SUM(generation), 0) FROM form_generations" + where, args).fetchone()[0]
+        return generation + edits
+
+    def _chunks(self, form_id, chunk_size, since_id=None):
+        # Keyset pagination so each chunk is an index range scan
+        conn = self._conn()
+        self._fresh_layouts(conn)
+        last_id = since_id or 0
+        while True:
+            where, args = self._where(form_id, last_id)
+            rows = conn.execute(
+                "SELECT id, layout, data FROM responses" + where + " ORDER BY id LIMIT ?", args + [chunk_size]
+            ).fetchall()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+
+    def iter_rows(self, form_id=None, chunk_size=5000):
+        for rows in self._chunks(form_id, chunk_size):
+            yield [self._decode(self._conn(), layout, data) for _, layout, data in rows]
+
+    def iter_records(self, form_id=None, since_id=None, chunk_size=5000):
+        # (ResponseID, row) pairs in id order, optionally only those after since_id
+        for rows in self._chunks(form_id, chunk_size, since_id):
+            yield [(rid, self._decode(self._conn(), layout, data)) for rid, layout, data in rows]
+
+    def iter_frames(self, form_id=None, chunk_size=50000):
+        for rows in self._chunks(form_id, chunk_size):
+            yield self._frame(rows)
+
+    def _frame(self, rows):
+        conn = self._conn()
+        df = pd.DataFrame([self._decode(conn, layout, data) for _, layout, data in rows], index=[r[0] for r in rows])
+        df.index.name = "ResponseID"
+        return df
+
+    def load(self, form_id=None, limit=None, since_id=None):
+        where, args = self._where(form_id, since_id)
+        sql = "SELECT id, layout, data FROM responses" + where + " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args += [limit]
+        conn = self._conn()
+        self._fresh_layouts(conn)
+        rows = conn.execute(sql, args).fetchall()
+        if not rows:
+            return pd.DataFrame()
+        return self._frame(rows)
+
+    def load_page(self, form_id, page, page_size, page_ends):
+        # Keyset paging: page n is the page_size rows after the last id of page
+        # n-1. page_ends (kept by the caller, e.g. in session state, per form and
+        # page size) remembers those ids, so stepping through pages reads only
+        # the page; a jump skips forward from the nearest remembered page over
+        # the id index alone.
+        known = max((p for p in page_ends if p < page), default=0)
+        after = page_ends.get(known, 0)
+        if known < page - 1:
+            after = self._id_after(form_id, after, (page - 1 - known) * page_size)
+            if after is None:
+                return pd.DataFrame()
+            page_ends[page - 1] = after
+        df = self.load(form_id=form_id, limit=page_size, since_id=after)
+        if not df.empty:
+            page_ends[page] = int(df.index[-1])
+        return df
+
+    def _id_after(self, form_id, since_id, rows):
+        # Id of the rows-th response after since_id, or None past the end
+        where, args = self._where(form_id, since_id)
+        row = self._conn().execute(
+            "SELECT id FROM responses" + where + " ORDER BY id LIMIT 1 OFFSET ?", args + [rows - 1]
+        ).fetchone()
+        return row[0] if row else None
+
+
+BACKENDS = {
+    ".db": SQLiteResponseStore,
+    ".sqlite": SQLiteResponseStore,
+    ".sqlite3": SQLiteResponseStore,
+}
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def open_response_store(path, **kwargs):
+    # One store per file and process; Streamlit reruns reuse it
+    key = os.path.abspath(path)
+    with _stores_lock:
+        if key not in _stores:
+            backend = BACKENDS.get(os.path.splitext(path)[1].lower())
+            if backend is None:
+                raise ValueError(f"No response store backend for '{path}'")
+            _stores[key] = backend(path, **kwargs)
+        return _stores[key]
@@ -0,0 +1,168 @@
+import os
+import re
+import glob
+import threading
+import pandas as pd
+
+# ----------------------------
+# Columnar Snapshots
+# ----------------------------
+# Dashboard analytics read responses from a Parquet snapshot kept next to the
+# response store instead of decoding every stored JSON row. Each form has its
+# own partition directory of parts named after the response id range they
+# hold, so a read touches only one form's files and only the columns it asks
+# for (memory-mapped, so unread columns are never paged in).
+#
+# A snapshot is brought up to date when it is read: rows newer than the last
+# part become one new part, and once a form has SNAPSHOT_MAX_PARTS parts they
+# are compacted into a single one. Edits and deletes bump the form's
+# generation in the store, which retires every part written before them. Parts are written
+# to a temporary file and renamed, and readers skip parts covered by a larger
+# one, so processes sharing the data directory never see a half-written or
+# doubled snapshot. Without the 'pyarrow' package, reads fall back to
+# streaming the store.
+
+SNAPSHOT_MAX_PARTS = 8
+SNAPSHOT_ID_COLUMN = "ResponseID"
+
+PART_RE = re.compile(r"^part-(\d+)-(\d+)-(\d+)\.parquet$")
+
+def _have_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _partition(form_id):
+    return "all" if form_id is None else "form=" + re.sub(r"[^A-Za-z0-9_.-]", "_", str(form_id))
+
+
+class ResponseSnapshot:
+    def __init__(self, store, snapshot_dir):
+        self.store = store
+        self.snapshot_dir = snapshot_dir
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _form_lock(self, form_id):
+        with self._lock:
+            return self._locks.setdefault(form_id, threading.Lock())
+
+    def _parts(self, form_id, generation):
+        # Non-overlapping cover of the current generation's parts, by id range
+        parts = []
+        for path in glob.glob(os.path.join(self.snapshot_dir, _partition(form_id), "part-*.parquet")):
+            m = PART_RE.match(os.path.basename(path))
+            if m and int(m.group(1)) == generation:
+                parts.append((int(m.group(2)), int(m.group(3)), path))
+        cover = []
+        for first, last, path in sorted(parts, key=lambda p: (p[0], -p[1])):
+            if not cover or first > cover[-1][1]:
+                cover.append((first, last, path))
+        return cover
+
+    def _write_part(self, form_id, generation, first, last, table):
+        import pyarrow.parquet as pq
+        directory = os.path.join(self.snapshot_dir, _partition(form_id))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{generation}-{first}-{last}.parquet")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def _table(self, records):
+        # Responses are free text, so every field is stored as a string column
+        import pyarrow as pa
+        names = {}
+        for _, row in records:
+            for col in row:
+                names.setdefault(col, None)
+        names.pop(SNAPSHOT_ID_COLUMN, None)
+        arrays = [pa.array([rid for rid, _ in records], pa.int64())]
+        for col in names:
+            arrays.append(pa.array([None if row.get(col) is None else str(row.get(col)) for _, row in records], pa.string()))
+        return pa.Table.from_arrays(arrays, names=[SNAPSHOT_ID_COLUMN] + [str(c) for c in names])
+
+    def _read(self, paths, columns=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        tables = []
+        for path in paths:
+            if columns is None:
+                tables.append(pq.read_table(path, memory_map=True))
+            else:
+                present = set(pq.read_schema(path).names)
+                tables.append(pq.read_table(path, columns=[c for c in [SNAPSHOT_ID_COLUMN] + columns if c in present], memory_map=True))
+        return pa.concat_tables(tables, promote_options="default") if tables else None
+
+    def refresh(self, form_id=None):
+        # Appends rows newer than the snapshot, compacting when parts pile up
+        with self._form_lock(form_id):
+            generation = self.store.generation(form_id)
+            parts = self._parts(form_id, generation)
+            watermark = parts[-1][1] if parts else 0
+            if self.store.max_id(form_id=form_id) > watermark:
+                records = [r for chunk in self.store.iter_records(form_id=form_id, since_id=watermark) for r in chunk]
+                if records:
+                    first, last = records[0][0], records[-1][0]
+                    parts.append((first, last, self._write_part(form_id, generation, first, last, self._table(records))))
+                    if not watermark:
+                        self._prune(form_id, generation)
+            if len(parts) >= SNAPSHOT_MAX_PARTS:
+                table = self._read([p[2] for p in parts])
+                self._write_part(form_id, generation, parts[0][0], parts[-1][1], table)
+                self._prune(form_id, generation, keep=(parts[0][0], parts[-1][1]))
+            return generation
+
+    def _prune(self, form_id, generation, keep=None):
+        # Drops parts from older generations and parts a compaction replaced
+        for path in glob.glob(os.path.join(self.snapshot_dir, _partition(form_id), "part-*.parquet")):
+            m = PART_RE.match(os.path.basename(path))
+            if not m:
+                continue
+            gen, first, last = map(int, m.groups())
+            stale = gen != generation
+            replaced = keep is not None and keep[0] <= first and last <= keep[1] and (first, last) != keep
+            if stale or replaced:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def read(self, form_id=None, columns=None):
+        # DataFrame indexed by ResponseID with only the requested columns
+        if not _have_pyarrow():
+            return self._read_store(form_id, columns)
+        generation = self.refresh(form_id)
+        for _ in range(3):
+            try:
+                table = self._read([p[2] for p in self._parts(form_id, generation)], columns)
+                break
+            except FileNotFoundError:
+                # A concurrent compaction removed a part between listing and reading
+                continue
+        else:
+            return self._read_store(form_id, columns)
+        if table is None:
+            return pd.DataFrame(columns=columns or [])
+        df = table.to_pandas(split_blocks=True, self_destruct=True).set_index(SNAPSHOT_ID_COLUMN)
+        if columns is not None:
+            df = df.reindex(columns=columns)
+        return df
+
+    def _read_store(self, form_id, columns):
+        frames = [f if columns is None else f.reindex(columns=columns) for f in self.store.iter_frames(form_id=form_id)]
+        return pd.concat(frames) if frames else pd.DataFrame(columns=columns or [])
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+def open_snapshot(store, snapshot_dir):
+    key = (os.path.abspath(store.db_path), os.path.abspath(snapshot_dir))
+    with _snapshots_lock:
+        if key not in _snapshots:
+            _snapshots[key] = ResponseSnapshot(store, snapshot_dir)
+        return _snapshots[key]
@@ -0,0 +1,27 @@
+import os
+import sqlite3
+
+# ----------------------------
+# Shared Storage
+# ----------------------------
+# Forms, responses, campaigns and exports all live in SQLite databases and
+# files under DATA_DIR, and nothing a request depends on is kept only in one
+# process. Any number of Streamlit processes (or replicas behind a load
+# balancer) can therefore serve the same deployment by pointing
+# FORM_APP_DATA_DIR at the same directory; SQLite's file locks serialise
+# their writes.
+#
+# WAL mode shares an index in memory-mapped files, which only works for
+# processes on one host. Replicas on several nodes that share a network volume
+# set FORM_APP_SHARED_VOLUME=1 to use a rollback journal instead.
+
+DATA_DIR = os.environ.get("FORM_APP_DATA_DIR", "data_store")
+SHARED_VOLUME = os.environ.get("FORM_APP_SHARED_VOLUME", "").lower() in ("1", "true", "yes")
+BUSY_TIMEOUT = float(os.environ.get("FORM_APP_BUSY_TIMEOUT", "30"))
+
+def connect(db_path, synchronous=None, **kwargs):
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, **kwargs)
+    conn.execute("PRAGMA journal_mode=" + ("DELETE" if SHARED_VOLUME else "WAL"))
+    if synchronous:
+        conn.execute(f"PRAGMA synchronous={synchronous}")
+    return conn
@@ -0,0 +1,20 @@
+import os
+from functools import partial
+
+from exports import export_reader, get_export
+from response_store import SQLiteResponseStore
+
+
+def test_stale_download_gets_the_current_export(tmp_path):
+    store = SQLiteResponseStore(str(tmp_path / "responses.db"))
+    export_dir = str(tmp_path / "exports")
+    store.append({"FormID": "f1", "Name": "Ann"})
+    old_path = get_export(store, "CSV", export_dir, form_id="f1", build=True)
+    rebuild = partial(get_export, store, "CSV", export_dir, form_id="f1", build=True)
+    stale = export_reader(old_path, rebuild)
+    assert "Ann" in stale().decode("utf-8-sig")
+
+    store.append({"FormID": "f1", "Name": "Bob"})
+    new_path = get_export(store, "CSV", export_dir, form_id="f1", build=True)
+    assert new_path != old_path and not os.path.exists(old_path)
+    assert "Bob" in stale().decode("utf-8-sig")
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook
+from openpyxl.worksheet.datavalidation import DataValidation
+
+import ingest
+
+
+@pytest.fixture
+def form_file(tmp_path):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Staff survey"])
+    ws.append([])
+    ws.append(["Name", "Team", "Office", "Age", "Start"])
+    ws.append(["Ann", "Red", "Paris", 31, datetime(2020, 5, 1)])
+    ws.append(["Bob", None, "Oslo", 45, None])
+    offices = wb.create_sheet("Lists")
+    for office in ["Paris", "Oslo", "Rome"]:
+        offices.append([office])
+    rules = [
+        DataValidation(type="list", formula1='"Red,Green,Blue"', sqref="B4:B100"),
+        DataValidation(type="list", formula1="Lists!$A$1:$A$3", sqref="C4:C100"),
+        DataValidation(type="whole", operator="between", formula1="18", formula2="99", sqref="D4:D100"),
+        DataValidation(type="date", operator="greaterThan", formula1="43831", sqref="E4:E100"),
+    ]
+    for dv in rules:
+        ws.add_data_validation(dv)
+    path = tmp_path / "form.xlsx"
+    wb.save(path)
+    return str(path)
+
+
+def test_fallback_reads_the_same_form(form_file, monkeypatch):
+    read_sheet = ingest._read_sheet
+    def no_fallback(*args):
+        raise AssertionError("the openpyxl fast path fell back")
+    monkeypatch.setattr(ingest, "_read_sheet", no_fallback)
+    fast = ingest.ingest_form_source(form_file)
+    monkeypatch.setattr(ingest, "_read_sheet", read_sheet)
+    monkeypatch.setattr(ingest, "WorkSheetParser", None)
+    slow = ingest.ingest_form_source(form_file)
+    assert fast.header_row == slow.header_row == 2
+    assert fast.frame.equals(slow.frame)
+    assert list(fast.frame.columns) == ["Name", "Team", "Office", "Age", "Start"]
+    assert fast.dropdowns == slow.dropdowns
+    assert fast.dropdowns[1] == ["Red", "Green", "Blue"]
+    assert fast.dropdowns[2] == ["Paris", "Oslo", "Rome"]
+    assert fast.validations == slow.validations
+    assert set(fast.validations) == {1, 2, 3, 4}
@@ -0,0 +1,59 @@
+import smtplib
+
+import pytest
+
+import mailer
+from campaigns import CampaignQueue
+
+
+class FakeConnection:
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+
+    def send(self, msg):
+        if self.error is not None:
+            raise self.error
+        self.sent.append(msg["To"])
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setattr(mailer, "get_connection", lambda *args, **kwargs: conn)
+    return conn
+
+
+def test_classify_error_retries_only_transient_failures():
+    classify = mailer.classify_error
+    assert classify(smtplib.SMTPServerDisconnected()) == "transient"
+    assert classify(smtplib.SMTPResponseException(451, b"try later")) == "transient"
+    assert classify(smtplib.SMTPResponseException(550, b"no such user")) == "permanent"
+    assert classify(smtplib.SMTPRecipientsRefused({"a@x": (450, b"busy")})) == "transient"
+    assert classify(smtplib.SMTPRecipientsRefused({"a@x": (450, b"busy"), "b@x": (550, b"gone")})) == "permanent"
+    assert classify(ConnectionRefusedError()) == "transient"
+    assert classify(ValueError()) == "permanent"
+
+def test_classify_error_blames_the_sender_for_login_and_quota():
+    classify = mailer.classify_error
+    assert classify(smtplib.SMTPAuthenticationError(535, b"5.7.8 Username and Password not accepted")) == "sender"
+    assert classify(smtplib.SMTPSenderRefused(550, b"not allowed", "me@x")) == "sender"
+    assert classify(smtplib.SMTPDataError(550, b"5.4.5 Daily user sending quota exceeded")) == "sender"
+
+def test_rejected_login_interrupts_campaign_without_failing_recipients(tmp_path, smtp):
+    smtp.error = smtplib.SMTPAuthenticationError(535, b"5.7.8 Username and Password not accepted")
+    queue = CampaignQueue(str(tmp_path / "campaigns.db"))
+    emails = [f"m{i}@example.com" for i in range(5)]
+    campaign_id = queue.create("f1", "me@example.com", emails, "Survey", "Hello", options={"rate": None, "backoff": 0})
+    queue._run(campaign_id, "wrong")
+    campaign = next(c for c in queue.list_campaigns() if c["id"] == campaign_id)
+    assert campaign["status"] == "interrupted"
+    assert "Username and Password not accepted" in campaign["error"]
+    assert queue.progress(campaign_id)["pending"] == 5
+    assert queue.dead_letters(campaign_id).empty
+    assert queue.requeue_transient(campaign_id) == 0
+
+    smtp.error = None
+    queue._run(campaign_id, "right")
+    assert queue.progress(campaign_id) == {"pending": 0, "sent": 5, "failed": 0, "total": 5}
+    assert sorted(smtp.sent) == emails
@@ -0,0 +1,19 @@
+import pandas as pd
+import pytest
+
+import members
+
+
+def test_normalize_emails_unwraps_mailto_links():
+    raw = pd.Series([" John@Example.COM ", "<mailto:x@Y.org>", "mailto:<a@b.io>", "MAILTO:c@d.io", "<e@f.io>"])
+    assert members.normalize_emails(raw).tolist() == ["John@example.com", "x@y.org", "a@b.io", "c@d.io", "e@f.io"]
+
+def test_unreachable_resolvers_mean_unknown_not_undeliverable(monkeypatch):
+    resolver = pytest.importorskip("dns.resolver")
+    def no_nameservers(domain, record, lifetime=None):
+        raise resolver.NoNameservers()
+    monkeypatch.setattr(resolver, "resolve", no_nameservers)
+    monkeypatch.setattr(members, "_mx_cache", {})
+    assert members._domain_accepts_mail("example.org") is None
+    emails, rejected = members.filter_deliverable(["a@example.org"])
+    assert emails == ["a@example.org"] and rejected.empty
@@ -0,0 +1,129 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from response_store import SQLiteResponseStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteResponseStore(str(tmp_path / "responses.db"))
+
+def _row(form_id, i, **extra):
+    row = {"FormID": form_id, "SubmittedAt": f"2024-01-{i % 28 + 1:02d} 10:00:00", "Name": f"n{i}", "Color": ["red", "blue"][i % 2]}
+    row.update(extra)
+    return row
+
+
+def test_concurrent_appends_keep_every_row(store):
+    ids = []
+    def submit(start):
+        for i in range(start, start + 50):
+            ids.append(store.append(_row("f1", i)))
+    threads = [threading.Thread(target=submit, args=(n * 50,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.count("f1") == 400
+    assert sorted(ids) == list(range(1, 401))
+    assert sorted(store.load("f1")["Name"]) == sorted(f"n{i}" for i in range(400))
+
+def test_timed_out_write_is_not_saved(tmp_path, monkeypatch):
+    store = SQLiteResponseStore(str(tmp_path / "responses.db"), write_timeout=0.05)
+    started, release = threading.Event(), threading.Event()
+    apply = store._apply
+    def slow_apply(conn, req):
+        started.set()
+        release.wait(5)
+        return apply(conn, req)
+    monkeypatch.setattr(store, "_apply", slow_apply)
+    first = threading.Thread(target=store.append, args=(_row("f1", 1),))
+    first.start()
+    started.wait(5)
+    with pytest.raises(TimeoutError):
+        store.append(_row("f1", 2))
+    release.set()
+    first.join()
+    assert store.append(_row("f1", 3)) == 2
+    assert list(store.load("f1")["Name"]) == ["n1", "n3"]
+
+def test_rename_field_rewrites_layouts(store):
+    store.append(_row("f1", 1))
+    store.append(_row("f1", 2, Extra="x"))
+    store.append(_row("f2", 3))
+    generation = store.generation("f1")
+    store.rename_field("f1", "Color", "Colour")
+    renamed = store.load("f1")
+    assert "Color" not in renamed.columns
+    assert list(renamed["Colour"]) == ["blue", "red"]
+    assert list(renamed["Extra"].fillna("")) == ["", "x"]
+    assert list(store.load("f2")["Color"]) == ["blue"]
+    assert store.generation("f1") > generation
+
+def test_legacy_import_keeps_each_form_to_its_own_columns(tmp_path):
+    legacy = tmp_path / "all_responses.xlsx"
+    pd.DataFrame([
+        {"FormID": "a", "SubmittedAt": "2024-01-01 10:00:00", "A1": "x"},
+        {"FormID": "b", "SubmittedAt": "2024-01-02 10:00:00", "Z9": "y"},
+    ]).to_excel(legacy, index=False)
+    store = SQLiteResponseStore(str(tmp_path / "responses.db"), legacy_xlsx=str(legacy))
+    assert sorted(store.load("a").columns) == ["A1", "FormID", "SubmittedAt"]
+    assert "A1" not in store.load("b").columns
+    assert list(store.stats("a").answered.index) == ["A1", "FormID", "SubmittedAt"]
+
+def test_stats_match_recount(store):
+    store.track_options("f1", ["Color"])
+    for i in range(10):
+        store.append(_row("f1", i, RespondentToken=f"t{i % 3}"))
+    store.append({"FormID": "f1", "Name": "undated"})
+    store.update(1, {"Color": "green"})
+    store.delete(2)
+    before = store.stats("f1")
+    assert before.responses == 10
+    assert before.respondents == 3
+    conn = store._conn()
+    with conn:
+        store._recount(conn)
+    after = store.stats("f1")
+    assert (before.responses, before.respondents) == (after.responses, after.respondents)
+    assert before.answered.sort_index().equals(after.answered.sort_index())
+    assert before.daily.equals(after.daily)
+    key = ["Field", "Option", "Day"]
+    assert before.options.sort_values(key).reset_index(drop=True).equals(after.options.sort_values(key).reset_index(drop=True))
+    assert before.options.groupby("Option")["Responses"].sum().to_dict() == {"blue": 4, "green": 1, "red": 4}
+    undated = conn.execute("SELECT COUNT(*) FROM stats_daily WHERE form_id='f1' AND day=''").fetchone()[0]
+    assert undated == 1
+
+
+def test_replicas_count_each_respondent_once(tmp_path):
+    # Two stores on one file stand in for two processes sharing the data directory
+    path = str(tmp_path / "responses.db")
+    replicas = [SQLiteResponseStore(path), SQLiteResponseStore(path)]
+    def submit(replica):
+        for i in range(200):
+            replica.append(_row("f1", i, RespondentToken=f"t{i}"))
+    threads = [threading.Thread(target=submit, args=(r,)) for r in replicas]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = replicas[0].stats("f1")
+    assert (stats.responses, stats.respondents) == (400, 200)
+
+def test_load_page_matches_offset_paging(store):
+    for i in range(95):
+        store.append(_row("f1" if i % 3 else "f2", i))
+    ids = list(store.load("f1").index)
+    stepped = {}
+    pages = [list(store.load_page("f1", page, 10, stepped).index) for page in range(1, 8)]
+    assert pages == [ids[n:n + 10] for n in range(0, 70, 10)]
+    jumped = {}
+    assert list(store.load_page("f1", 6, 10, jumped).index) == ids[50:60]
+    assert list(store.load_page("f1", 4, 10, jumped).index) == ids[30:40]
+    assert store.load_page("f1", 9, 10, jumped).empty
+    plan = store._conn().execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM responses WHERE form_id=? AND id>? ORDER BY id LIMIT 1 OFFSET 5", ("f1", 0)
+    ).fetchall()
+    assert "COVERING INDEX" in " ".join(r[-1] for r in plan)
@@ -0,0 +1,36 @@
+import multiprocessing
+
+import tokens
+from tokens import RecipientTokens, new_token, verify_token
+
+
+def test_tokens_verify_only_for_their_form(tmp_path):
+    token = new_token("f1")
+    assert verify_token("f1", token)
+    assert not verify_token("f2", token)
+    assert not verify_token("f1", token[:-1] + ("A" if token[-1] != "A" else "B"))
+    assert not verify_token("f1", None)
+    index = RecipientTokens(str(tmp_path / "tokens.db"))
+    issued = index.issue("f1", "c1", ["a@example.com"])
+    assert index.lookup("f1", issued["a@example.com"])["email"] == "a@example.com"
+    assert index.lookup("f2", issued["a@example.com"]) is None
+    assert index.lookup("f1", new_token("f1")) is None
+
+def _generated_key(data_dir, results):
+    tokens.DATA_DIR = data_dir
+    tokens.SECRET_PATH = f"{data_dir}/token_secret.key"
+    tokens._secret = None
+    results.put(tokens._signing_key())
+
+def test_processes_agree_on_a_generated_key(tmp_path, monkeypatch):
+    monkeypatch.delenv("FORM_APP_SECRET")
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_generated_key, args=(str(tmp_path), results)) for _ in range(6)]
+    for p in procs:
+        p.start()
+    keys = {results.get(timeout=10) for _ in procs}
+    for p in procs:
+        p.join()
+    assert len(keys) == 1
+    assert len(keys.pop()) == 64
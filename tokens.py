@@ -0,0 +1,134 @@
+import os
+import hmac
+import base64
+import hashlib
+import secrets
+import sqlite3
+import threading
+from datetime import datetime
+from storage import DATA_DIR, connect
+
+# ----------------------------
+# Recipient Tokens
+# ----------------------------
+# Every invited member gets a personal link carrying a token. The token is a
+# random nonce plus an HMAC over (form id, nonce), so a forged or mistyped
+# token is rejected without touching the database, and a token only works on
+# the form it was issued for. The token -> member index is a primary-key
+# lookup, and each submission records which member it came from.
+#
+# The signing key comes from FORM_APP_SECRET, or is generated once into
+# DATA_DIR so every process sharing the data directory agrees on it.
+
+SECRET_PATH = os.path.join(DATA_DIR, "token_secret.key")
+TOKEN_PARAM = "t"
+
+_secret = None
+_secret_lock = threading.Lock()
+
+def _signing_key():
+    global _secret
+    with _secret_lock:
+        if _secret is None:
+            env = os.environ.get("FORM_APP_SECRET")
+            if env:
+                _secret = env.encode("utf-8")
+            else:
+                os.makedirs(DATA_DIR, exist_ok=True)
+                # Written in full to a private temp file and then linked into
+                # place, so no process can ever read a partial key; if another
+                # process got there first, its key wins
+                tmp_path = f"{SECRET_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(secrets.token_hex(32))
+                try:
+                    os.link(tmp_path, SECRET_PATH)
+                except FileExistsError:
+                    pass
+                finally:
+                    os.remove(tmp_path)
+                with open(SECRET_PATH) as f:
+                    key = f.read().strip()
+                if not key:
+                    raise RuntimeError(f"Token signing key {SECRET_PATH} is empty; delete it or set FORM_APP_SECRET")
+                _secret = key.encode("utf-8")
+        return _secret
+
+def _signature(form_id, nonce):
+    digest = hmac.new(_signing_key(), f"{form_id}.{nonce}".encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:12]).decode("ascii")
+
+def new_token(form_id):
+    nonce = secrets.token_urlsafe(9)
+    return f"{nonce}.{_signature(form_id, nonce)}"
+
+def verify_token(form_id, token):
+    nonce, _, signature = str(token or "").partition(".")
+    return bool(nonce and signature) and hmac.compare_digest(signature, _signature(form_id, nonce))
+
+def personal_link(link, token):
+    return f"{link}{'&' if '?' in link else '?'}{TOKEN_PARAM}={token}"
+
+
+class RecipientTokens:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS recipient_tokens ("
+                "token TEXT PRIMARY KEY, form_id TEXT, campaign_id TEXT, email TEXT, created_at TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_recipient_tokens_campaign ON recipient_tokens(campaign_id, email)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_recipient_tokens_form ON recipient_tokens(form_id, email)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def issue(self, form_id, campaign_id, emails):
+        # One token per address, generated and stored in a single transaction
+        now = datetime.now().isoformat(timespec="seconds")
+        tokens = {email: new_token(form_id) for email in emails}
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO recipient_tokens (token, form_id, campaign_id, email, created_at) VALUES (?,?,?,?,?)",
+                [(token, form_id, campaign_id, email, now) for email, token in tokens.items()],
+            )
+        return tokens
+
+    def for_campaign(self, campaign_id):
+        rows = self._conn().execute("SELECT email, token FROM recipient_tokens WHERE campaign_id=?", (campaign_id,))
+        return {r["email"]: r["token"] for r in rows}
+
+    def invited(self, form_id):
+        # Distinct members invited to a form across all its campaigns
+        return self._conn().execute(
+            "SELECT COUNT(DISTINCT email) FROM recipient_tokens WHERE form_id=?", (form_id,)
+        ).fetchone()[0]
+
+    def lookup(self, form_id, token):
+        # The invited member behind a token, or None for anonymous/invalid links
+        if not verify_token(form_id, token):
+            return None
+        row = self._conn().execute(
+            "SELECT form_id, campaign_id, email FROM recipient_tokens WHERE token=? AND form_id=?", (token, form_id)
+        ).fetchone()
+        return dict(row) if row else None
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def open_recipient_tokens(path):
+    key = os.path.abspath(path)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = RecipientTokens(path)
+        return _indexes[key]
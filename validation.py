@@ -0,0 +1,153 @@
+from collections import namedtuple
+import pandas as pd
+from form_plans import EMAIL_RE
+
+# ----------------------------
+# Response Validation
+# ----------------------------
+# The widgets only guide the respondent; the rules in a form's plan (taken
+# from the source workbook's data validations and the inferred field types)
+# are what a response is checked against, both when it is submitted and when
+# stored responses are re-validated in bulk after a rule change.
+#
+# Every check works on a whole column at once, so a single submission is just
+# a one-row frame and a bulk pass costs a handful of vectorized operations per
+# field rather than a Python call per cell.
+
+BULK_CHUNK_ROWS = 50000
+
+OPERATORS = {
+    "between": (lambda s, a, b: s.between(a, b), "between {0} and {1}"),
+    "notBetween": (lambda s, a, b: ~s.between(a, b), "not between {0} and {1}"),
+    "equal": (lambda s, a, b: s == a, "equal to {0}"),
+    "notEqual": (lambda s, a, b: s != a, "not equal to {0}"),
+    "greaterThan": (lambda s, a, b: s > a, "greater than {0}"),
+    "lessThan": (lambda s, a, b: s < a, "less than {0}"),
+    "greaterThanOrEqual": (lambda s, a, b: s >= a, "at least {0}"),
+    "lessThanOrEqual": (lambda s, a, b: s <= a, "at most {0}"),
+}
+
+ValidationReport = namedtuple("ValidationReport", ["checked", "counts", "invalid"])
+
+def _as_text(series):
+    return series.astype("string").str.strip()
+
+def _as_dates(text):
+    # ISO dates (what the date widget stores) parse vectorized; only the
+    # leftovers fall back to per-value format guessing
+    dates = pd.to_datetime(text, errors="coerce", format="ISO8601")
+    rest = dates.isna() & text.notna()
+    if rest.any():
+        dates[rest] = pd.to_datetime(text[rest], errors="coerce", format="mixed")
+    return dates.dt.normalize()
+
+def _bounds(rule, convert):
+    values = list(rule.get("values") or []) + [None, None]
+    return [None if v is None else convert(v) for v in values[:2]]
+
+def _operator_ok(values, rule, convert):
+    # Bounds that could not be resolved from the workbook are not enforced
+    operator = OPERATORS.get(rule.get("operator") or "between")
+    low, high = _bounds(rule, convert)
+    if operator is None or low is None or (high is None and "{1}" in operator[1]):
+        return pd.Series(True, index=values.index)
+    return operator[0](values, low, high).fillna(False)
+
+def _field_invalid(field, series):
+    text = _as_text(series)
+    blank = text.isna() | (text == "")
+    rules = field.get("rules") or {}
+    rule = rules.get("validation") or {}
+    kind = rule.get("type")
+    ok = pd.Series(True, index=series.index)
+
+    if kind in ("whole", "decimal") or field["type"] == "number":
+        numbers = pd.to_numeric(text, errors="coerce")
+        ok &= numbers.notna()
+        if kind == "whole" or rules.get("integer"):
+            ok &= (numbers % 1 == 0).fillna(False)
+        if kind in ("whole", "decimal"):
+            ok &= _operator_ok(numbers, rule, float)
+    elif kind == "date" or field["type"] == "date":
+        dates = _as_dates(text)
+        ok &= dates.notna()
+        if kind == "date":
+            ok &= _operator_ok(dates, rule, pd.Timestamp)
+    elif kind == "textLength":
+        ok &= _operator_ok(text.str.len().astype("float"), rule, float)
+
+    options = rule.get("options") if kind == "list" else rules.get("options")
+    if options:
+        ok &= text.isin([str(o).strip() for o in options]).fillna(False)
+    if rules.get("format") == "email":
+        ok &= text.str.match(EMAIL_RE).fillna(False)
+
+    invalid = ~blank & ~ok
+    if rules.get("required"):
+        invalid |= blank
+    return invalid.astype(bool)
+
+def field_message(field):
+    rules = field.get("rules") or {}
+    rule = rules.get("validation") or {}
+    kind = rule.get("type")
+    if kind == "list" or (kind is None and rules.get("options")):
+        return "must be one of the listed options"
+    if rules.get("format") == "email":
+        return "must be a valid email address"
+    what = {
+        "whole": "a whole number",
+        "decimal": "a number",
+        "date": "a date",
+        "textLength": "text with a length",
+    }.get(kind)
+    if what is None:
+        what = {"number": "a whole number" if rules.get("integer") else "a number", "date": "a date"}.get(field["type"])
+        return f"must be {what}" if what else "is invalid"
+    operator = OPERATORS.get(rule.get("operator") or "between")
+    bounds = [f"{v:g}" if isinstance(v, float) else v for v in (rule.get("values") or []) if v is not None]
+    if operator is None or len(bounds) < operator[1].count("{"):
+        return f"must be {what}"
+    return f"must be {what} " + operator[1].format(*bounds)
+
+def check_frame(plan, df):
+    # True where a cell breaks its field's rules; fields missing from df count as blank
+    invalid = {}
+    for field in plan:
+        name = field["name"]
+        column = df[name] if name in df.columns else pd.Series(None, index=df.index, dtype="object")
+        if isinstance(column, pd.DataFrame):
+            column = column.iloc[:, 0]
+        invalid[name] = _field_invalid(field, column)
+    return pd.DataFrame(invalid, index=df.index, columns=[f["name"] for f in plan])
+
+def validate_submission(plan, values):
+    # {field name: message} for every field the submission gets wrong
+    row = pd.DataFrame([{name: values.get(name) for name in values}])
+    invalid = check_frame(plan, row).iloc[0]
+    messages = {}
+    for field in plan:
+        if invalid[field["name"]]:
+            blank = values.get(field["name"]) is None or str(values.get(field["name"])).strip() == ""
+            messages[field["name"]] = "is required" if blank else field_message(field)
+    return messages
+
+def validate_responses(store, plan, form_id, chunk_size=BULK_CHUNK_ROWS):
+    # Re-checks every stored response of a form; returns per-field violation
+    # counts and the failing rows (ResponseID -> failing field names)
+    checked = 0
+    counts = pd.Series(0, index=[f["name"] for f in plan], dtype="int64")
+    failing = []
+    for chunk in store.iter_frames(form_id=form_id, chunk_size=chunk_size):
+        invalid = check_frame(plan, chunk)
+        checked += len(chunk)
+        counts += invalid.sum()
+        bad = invalid[invalid.any(axis=1)]
+        if not bad.empty:
+            names = pd.Series("", index=bad.index, dtype="object")
+            for name in bad.columns:
+                names = names.where(~bad[name], names + ", " + str(name))
+            failing.append(names.str[2:])
+    invalid_rows = pd.concat(failing) if failing else pd.Series(dtype="object")
+    invalid_rows.index.name = "ResponseID"
+    return ValidationReport(checked, counts, invalid_rows.rename("Invalid Fields").to_frame())